@@ -0,0 +1,255 @@
+"""Benchmarks the hot paths of mistreedev on seeded synthetic data.
+
+Each benchmark is run on point clouds or random trees of increasing size, the
+wall time (best of several repeats) and peak allocated memory are recorded and
+stored in a JSON file keyed by the git commit, so that runs on different
+commits can be compared automatically.
+
+Usage:
+
+```
+python benchmarks/run_benchmarks.py --sizes 1000 10000 100000
+python benchmarks/run_benchmarks.py --sizes 1000 10000 --compare <commit>
+```
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import mistreedev as mistdev
+
+
+def get_commit():
+    """Returns the current git commit, with a '-dirty' suffix if the tree has
+    uncommitted changes."""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=cwd).decode().strip()
+        status = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    if len(status) > 0:
+        commit += '-dirty'
+    return commit
+
+
+def get_points(size, seed=0):
+    """Seeded clustered point cloud in a unit box, half the points are uniform and
+    half are placed in small gaussian clumps so that groups are found."""
+    rng = np.random.default_rng(seed)
+    Nuniform = size//2
+    Nclump = size - Nuniform
+    centres = rng.random((max(Nclump//20, 1), 3))
+    pos_clump = centres[rng.integers(0, len(centres), Nclump)] + rng.normal(scale=0.2*size**(-1./3.), size=(Nclump, 3))
+    pos = np.concatenate([rng.random((Nuniform, 3)), np.mod(pos_clump, 1.)])
+    return pos[:, 0], pos[:, 1], pos[:, 2]
+
+
+def get_random_tree(size, seed=0):
+    """Seeded random recursive tree with size nodes and random edge lengths."""
+    rng = np.random.default_rng(seed)
+    parent = (rng.random(size - 1)*np.arange(1, size)).astype('int')
+    edge_index = np.array([parent, np.arange(1, size)])
+    edge_length = rng.exponential(size=size - 1)
+    return edge_index, edge_length
+
+
+def setup_get_catalogue(size):
+    x, y, z = get_points(size)
+    linking_length = 0.2*size**(-1./3.)
+    return (linking_length, x, y, z)
+
+
+def run_get_catalogue(linking_length, x, y, z):
+    gf = mistdev.GroupFinder()
+    gf.get_catalogue(linking_length, x, y, z)
+
+
+def setup_get_groupID(size):
+    edge_index, edge_length = get_random_tree(size)
+    return (size, edge_index, edge_length, np.median(edge_length))
+
+
+def run_get_groupID(size, edge_index, edge_length, max_linking_length):
+    # set_tree sorts the edges and builds the merge tree, so it is timed with
+    # the query.
+    fragment = mistdev.Fragment()
+    fragment.set_tree(size, edge_length, edge_index)
+    fragment.get_groupID(0., max_linking_length)
+
+
+def setup_get_groupID_window(size):
+    edge_index, edge_length = get_random_tree(size)
+    fragment = mistdev.Fragment()
+    fragment.set_tree(size, edge_length, edge_index)
+    return (fragment, np.quantile(edge_length, 0.25), np.quantile(edge_length, 0.75))
+
+
+def run_get_groupID_window(fragment, min_linking_length, max_linking_length):
+    fragment.get_groupID(min_linking_length, max_linking_length)
+
+
+def setup_friends2groups(size):
+    edge_index, edge_length = get_random_tree(size)
+    condition = np.where(edge_length < np.median(edge_length))[0]
+    return (mistdev.find_friends(size, edge_index[:, condition]),)
+
+
+def run_friends2groups(friends):
+    mistdev.friends2groups(friends)
+
+
+def setup_get_group_edges(size):
+    edge_index, edge_length = get_random_tree(size)
+    condition = np.where(edge_length < np.median(edge_length))[0]
+    friends = mistdev.find_friends(size, edge_index[:, condition])
+    groups = mistdev.friends2groups(friends)
+    return (groups, mistdev.get_friends_in_groups(friends, groups))
+
+
+def run_get_group_edges(groups, friends_in_groups):
+    mistdev.get_group_edges(groups, friends_in_groups)
+
+
+def setup_get_group_edge_index(size):
+    edge_index, edge_length = get_random_tree(size)
+    condition = np.where(edge_length < np.median(edge_length))[0]
+    groups = mistdev.friends2groups(mistdev.find_friends(size, edge_index[:, condition]))
+    return (groups, edge_index[:, condition], size)
+
+
+def run_get_group_edge_index(groups, edge_index, size):
+    mistdev.get_group_edge_index(groups, edge_index, size)
+
+
+def setup_trim_tree(size):
+    edge_index, edge_length = get_random_tree(size)
+    degree = np.bincount(np.ravel(edge_index), minlength=size).astype('float')
+    return (degree, edge_index, edge_length)
+
+
+def run_trim_tree(degree, edge_index, edge_length):
+    mistdev.trim_tree(degree, edge_index, edge_length)
+
+
+def get_spatial_tree(size, seed=0):
+    """Seeded uniform points joined into a path which snakes through a grid of
+    cells, so that edges are short like those of a minimum spanning tree."""
+    rng = np.random.default_rng(seed)
+    pos = rng.random((size, 3))
+    ncells = max(int(size**(1./3.)), 1)
+    i, j, k = np.minimum((pos*ncells).astype('int'), ncells - 1).T
+    # alternate the direction of each row so consecutive cells are adjacent.
+    j = np.where(i % 2 == 0, j, ncells - 1 - j)
+    k = np.where((i*ncells + j) % 2 == 0, k, ncells - 1 - k)
+    order = np.argsort((i*ncells + j)*ncells + k, kind='stable')
+    edge_index = np.array([order[:-1], order[1:]])
+    return pos[:, 0], pos[:, 1], pos[:, 2], edge_index
+
+
+def setup_count_in_cylinders(size):
+    x, y, z, edge_index = get_spatial_tree(size)
+    rmax = np.linspace(0.1, 1., 5)*size**(-1./3.)
+    return (x, y, z, edge_index, rmax)
+
+
+def run_count_in_cylinders(x, y, z, edge_index, rmax):
+    mistdev.count_in_cylinders(x, y, z, edge_index, rmax)
+
+
+# name -> (setup, run, largest size), the largest size limits benchmarks which
+# return python lists of groups.
+benchmarks = {
+    'GroupFinder.get_catalogue': (setup_get_catalogue, run_get_catalogue, 10**7),
+    'Fragment.get_groupID': (setup_get_groupID, run_get_groupID, 10**7),
+    'Fragment.get_groupID window': (setup_get_groupID_window, run_get_groupID_window, 10**7),
+    'friends2groups': (setup_friends2groups, run_friends2groups, 10**6),
+    'get_group_edges': (setup_get_group_edges, run_get_group_edges, 10**6),
+    'get_group_edge_index': (setup_get_group_edge_index, run_get_group_edge_index, 10**7),
+    'trim_tree': (setup_trim_tree, run_trim_tree, 10**7),
+    'count_in_cylinders': (setup_count_in_cylinders, run_count_in_cylinders, 10**6),
+}
+
+
+def run_benchmark(name, size, repeat=3):
+    """Runs one benchmark, returning the best wall time in seconds and the peak
+    allocated memory in bytes. Memory is traced in a separate run so tracing
+    does not affect the timing."""
+    setup, run, _ = benchmarks[name]
+    args = setup(size)
+    wall_time = np.inf
+    for i in range(0, repeat):
+        t0 = time.perf_counter()
+        run(*args)
+        wall_time = min(wall_time, time.perf_counter() - t0)
+    tracemalloc.start()
+    run(*args)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return wall_time, peak_memory
+
+
+def compare_results(results, reference, threshold=1.2):
+    """Prints the ratio of each timing and memory to a reference run, flagging
+    ratios above threshold."""
+    print('%-28s %10s %10s %10s' % ('benchmark', 'size', 'time', 'memory'))
+    for name in results:
+        for size in results[name]:
+            if name not in reference or size not in reference[name]:
+                continue
+            time_ratio = results[name][size]['time']/reference[name][size]['time']
+            memory_ratio = results[name][size]['peak_memory']/max(reference[name][size]['peak_memory'], 1)
+            flag = ' <- regression' if time_ratio > threshold or memory_ratio > threshold else ''
+            print('%-28s %10s %9.2fx %9.2fx%s' % (name, size, time_ratio, memory_ratio, flag))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the mistreedev benchmarks.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--only', nargs='+', default=None, help='Names of benchmarks to run.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.json'))
+    parser.add_argument('--compare', default=None, help='Commit to compare against, by default the last stored run.')
+    parser.add_argument('--threshold', type=float, default=1.2)
+    options = parser.parse_args()
+
+    names = list(benchmarks) if options.only is None else options.only
+    results = {}
+    for name in names:
+        results[name] = {}
+        for size in options.sizes:
+            if size > benchmarks[name][2]:
+                continue
+            wall_time, peak_memory = run_benchmark(name, size, repeat=options.repeat)
+            results[name][str(size)] = {'time': wall_time, 'peak_memory': peak_memory}
+            print('%-28s %10i %10.4f s %10.2f MB' % (name, size, wall_time, peak_memory/1e6))
+
+    stored = {}
+    if os.path.exists(options.output):
+        with open(options.output) as f:
+            stored = json.load(f)
+    commit = get_commit()
+    reference = options.compare
+    if reference is None:
+        previous = [key for key in stored if key != commit]
+        reference = previous[-1] if len(previous) > 0 else None
+    if reference is not None and reference in stored:
+        print('\nCompared to %s:' % reference)
+        compare_results(results, stored[reference]['results'], threshold=options.threshold)
+    stored.pop(commit, None)
+    stored[commit] = {'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}
+    with open(options.output, 'w') as f:
+        json.dump(stored, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,103 @@
+"""Submodules are loaded on first use, so importing mistreedev does not import
+scikit-learn, scipy or mistree until a function which needs them is accessed."""
 
-# Group Finder Algorithms
-from .group_finder import find_friends_2d
-from .group_finder import find_friends_3d
-from .group_finder import count_friends
-from .group_finder import get_groups
-from .group_finder import get_group_param_mean
-from .group_finder import get_group_param_sum
-from .group_finder import GroupFinder
-
-# Near MST functions
-from .near_mst import dist_from_line
-from .near_mst import count_in_cylinder
-
-# Structure Finder
-from .structurefinder import find_friends
-from .structurefinder import friends2groups
-from .structurefinder import get_group_mean
-from .structurefinder import get_friends_in_groups
-from .structurefinder import get_group_edges
-
-# trim function
-from .trim import find_edge4point
-from .trim import remove_tree_tips
-from .trim import trim_tree
-
-from .fragment import id2groups
-from .fragment import Fragment
+import importlib
+
+# public name -> submodule
+_lazy_imports = {
+    # Group Finder Algorithms
+    'set_kdtree_cache': 'group_finder',
+    'clear_kdtree_cache': 'group_finder',
+    'get_kdtree': 'group_finder',
+    'find_friends_nd': 'group_finder',
+    'find_friends_2d': 'group_finder',
+    'find_friends_3d': 'group_finder',
+    'find_pairs_nd': 'group_finder',
+    'find_pairs_2d': 'group_finder',
+    'find_pairs_3d': 'group_finder',
+    'get_pairs': 'group_finder',
+    'get_group_labels_sweep': 'group_finder',
+    'count_friends': 'group_finder',
+    'get_groups': 'group_finder',
+    'get_group_param_mean': 'group_finder',
+    'get_group_param_mean_periodic': 'group_finder',
+    'get_group_param_sum': 'group_finder',
+    'GroupFinder': 'group_finder',
+
+    # Near MST functions
+    'set_backend': 'near_mst',
+    'get_backend': 'near_mst',
+    'dist_from_line': 'near_mst',
+    'count_in_cylinder': 'near_mst',
+    'count_in_cylinders': 'near_mst',
+    'get_cylinder_profile': 'near_mst',
+
+    # Structure Finder
+    'find_friends': 'structurefinder',
+    'find_friends_csr': 'structurefinder',
+    'friends2groups': 'structurefinder',
+    'get_group_mean': 'structurefinder',
+    'get_friends_in_groups': 'structurefinder',
+    'get_group_edges': 'structurefinder',
+    'get_group_edge_index': 'structurefinder',
+
+    # trim function
+    'find_edge4point': 'trim',
+    'remove_tree_tips': 'trim',
+    'get_trim_rounds': 'trim',
+    'trim_tree': 'trim',
+    'trim_forest': 'trim',
+
+    'id2groups': 'fragment',
+    'Fragment': 'fragment',
+
+    # Union-find
+    'UnionFind': 'union_find',
+
+    # Sparse adjacency
+    'friends2csr': 'adjacency',
+    'edges2csr': 'adjacency',
+    'clean_csr': 'adjacency',
+    'csr2friends': 'adjacency',
+    'get_component_labels': 'adjacency',
+    'labels2groups': 'adjacency',
+    'groups2labels': 'adjacency',
+    'groups2members': 'adjacency',
+
+    # Group catalogue
+    'GroupCatalogue': 'catalogue',
+    'labels2catalogue': 'catalogue',
+
+    # Group reductions
+    'get_label_stats': 'reduction',
+    'get_label_mean_periodic': 'reduction',
+
+    # Tiled and parallel group finders
+    'find_groups_tiled': 'tiled',
+    'find_groups_parallel': 'parallel',
+
+    # Streaming catalogue output
+    'write_catalogue': 'stream',
+    'load_catalogue': 'stream',
+
+    # Cell-linked-list neighbour search
+    'find_friends_grid': 'grid',
+
+    # Stage statistics
+    'StageStats': 'stats',
+}
+
+__all__ = list(_lazy_imports)
+
+
+def __getattr__(name):
+    if name in _lazy_imports:
+        module = importlib.import_module('.' + _lazy_imports[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
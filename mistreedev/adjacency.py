@@ -0,0 +1,200 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from .catalogue import GroupCatalogue, get_label_dtype, labels2catalogue
+
+
+def friends2csr(friends):
+    """Converts a list of friends for each point to a compressed sparse row (CSR)
+    adjacency.
+
+    Parameters
+    ----------
+    friends : list
+        A list of friends for each given point, for example the output of a
+        KDTree query_radius.
+
+    Returns
+    -------
+    indptr : int array
+        The friends of point i are indices[indptr[i]:indptr[i+1]].
+    indices : int array
+        The friends of every point, stored contiguously.
+    """
+    counts = np.array([len(friends[i]) for i in range(0, len(friends))], dtype='int')
+    indptr = np.zeros(len(friends) + 1, dtype='int')
+    indptr[1:] = np.cumsum(counts)
+    if indptr[-1] == 0:
+        return indptr, np.array([], dtype='int')
+    indices = np.concatenate([np.asarray(friends[i], dtype='int') for i in range(0, len(friends))])
+    return indptr, indices
+
+
+def edges2csr(Npoint, index1, index2):
+    """Builds a symmetric compressed sparse row (CSR) adjacency from edges.
+
+    Parameters
+    ----------
+    Npoint : int
+        Number of points.
+    index1, index2 : array
+        Index of the points at either end of each edge.
+
+    Returns
+    -------
+    indptr : int array
+        The friends of point i are indices[indptr[i]:indptr[i+1]].
+    indices : int array
+        The friends of every point, stored contiguously and sorted for each point.
+    """
+    row = np.concatenate([index1, index2]).astype('int')
+    col = np.concatenate([index2, index1]).astype('int')
+    order = np.lexsort((col, row))
+    indptr = np.zeros(Npoint + 1, dtype='int')
+    indptr[1:] = np.cumsum(np.bincount(row, minlength=Npoint))
+    indices = col[order]
+    return indptr, indices
+
+
+def clean_csr(indptr, indices):
+    """Sorts the friends of each point and removes each point from its own friends.
+
+    Parameters
+    ----------
+    indptr, indices : int array
+        CSR adjacency.
+
+    Returns
+    -------
+    indptr, indices : int array
+        Cleaned CSR adjacency.
+    """
+    Npoint = len(indptr) - 1
+    row = np.repeat(np.arange(Npoint), np.diff(indptr))
+    condition = np.where(indices != row)[0]
+    row = row[condition]
+    col = indices[condition]
+    order = np.lexsort((col, row))
+    indptr = np.zeros(Npoint + 1, dtype='int')
+    indptr[1:] = np.cumsum(np.bincount(row, minlength=Npoint))
+    return indptr, col[order]
+
+
+def csr2friends(indptr, indices):
+    """Converts a CSR adjacency to a list of friends for each point.
+
+    Parameters
+    ----------
+    indptr, indices : int array
+        CSR adjacency.
+
+    Returns
+    -------
+    friends : list
+        A list of friends for each given point.
+    """
+    return np.split(indices, indptr[1:-1])
+
+
+def get_component_labels(indptr, indices, dtype=None):
+    """Labels the connected components of a CSR adjacency in a single linear pass.
+
+    Parameters
+    ----------
+    indptr, indices : int array
+        CSR adjacency.
+    dtype : dtype, optional
+        Label dtype, by default int32 or int64 depending on the number of points.
+
+    Returns
+    -------
+    labels : int array
+        Group label of each point, -1 means the point is not a member of any
+        group. Groups are ordered by their first member.
+    """
+    Npoint = len(indptr) - 1
+    graph = csr_matrix((np.ones(len(indices), dtype='int8'), indices, indptr), shape=(Npoint, Npoint))
+    Ncomponent, component = connected_components(graph, directed=False)
+    size = np.bincount(component, minlength=Ncomponent)
+    # relabel so groups are ordered by their smallest member.
+    first = np.zeros(Ncomponent, dtype='int') + Npoint
+    np.minimum.at(first, component, np.arange(Npoint))
+    is_group = size > 1
+    order = np.argsort(first[is_group], kind='stable')
+    component_label = np.zeros(Ncomponent, dtype='int') - 1
+    component_label[np.where(is_group)[0][order]] = np.arange(len(order))
+    labels = component_label.astype(get_label_dtype(Npoint, dtype))[component]
+    return labels
+
+
+def labels2groups(labels):
+    """Converts the group label of each point to a list of members in each group.
+
+    Parameters
+    ----------
+    labels : int array
+        Group label of each point, -1 means the point is not a member of any group.
+
+    Returns
+    -------
+    groups : list
+        A list of member points in each group.
+    """
+    groups = list(labels2catalogue(labels))
+    return groups
+
+
+def groups2labels(groups, Npoint, dtype=None):
+    """Converts a list of members in each group to the group label of each point.
+
+    Parameters
+    ----------
+    groups : list or GroupCatalogue
+        A list of member points in each group.
+    Npoint : int
+        Number of points.
+    dtype : dtype, optional
+        Label dtype, by default int32 or int64 depending on the number of points.
+
+    Returns
+    -------
+    labels : int array
+        Group label of each point, -1 means the point is not a member of any group.
+    """
+    if isinstance(groups, GroupCatalogue):
+        return groups.get_labels(Npoint, dtype=dtype)
+    labels = np.full(Npoint, -1, dtype=get_label_dtype(Npoint, dtype))
+    if len(groups) > 0:
+        sizes = np.array([len(groups[i]) for i in range(0, len(groups))], dtype='int')
+        members = np.concatenate([np.asarray(groups[i], dtype='int') for i in range(0, len(groups))])
+        labels[members] = np.repeat(np.arange(len(groups)), sizes)
+    return labels
+
+
+def groups2members(groups):
+    """Flattens a list of members in each group to the members of all groups and
+    the group of each member. Unlike groups2labels a point may be a member of
+    several groups, it is then listed once for each group.
+
+    Parameters
+    ----------
+    groups : list or GroupCatalogue
+        A list of member points in each group.
+
+    Returns
+    -------
+    members : int array
+        Members of every group, stored contiguously.
+    member_labels : int array
+        The group of each member.
+    """
+    if isinstance(groups, GroupCatalogue):
+        members = np.asarray(groups.members)
+        sizes = groups.get_sizes()
+    else:
+        sizes = np.array([len(groups[i]) for i in range(0, len(groups))], dtype='int')
+        members = np.concatenate([np.asarray(groups[i], dtype='int') for i in range(0, len(groups))]
+                                 + [np.array([], dtype='int')])
+    member_labels = np.repeat(np.arange(len(sizes)), sizes)
+    return members, member_labels
@@ -0,0 +1,193 @@
+import numpy as np
+
+
+def get_label_dtype(Nmax, dtype=None):
+    """Returns the integer dtype used for labels, counts and indices, int32 if all
+    values fit and int64 otherwise.
+
+    Parameters
+    ----------
+    Nmax : int
+        Largest value (e.g. the number of points) the dtype must hold.
+    dtype : dtype, optional
+        User specified dtype, returned unchanged. A float dtype gives the float
+        labels of older versions.
+
+    Returns
+    -------
+    dtype : dtype
+        Label dtype.
+    """
+    if dtype is not None:
+        return np.dtype(dtype)
+    if Nmax < np.iinfo('int32').max:
+        return np.dtype('int32')
+    return np.dtype('int64')
+
+
+class GroupCatalogue:
+
+    """Compact container of the members of each group.
+
+    The members of all groups are stored in one contiguous index array, with the
+    members of group i given by members[offsets[i]:offsets[i+1]]. The container
+    can be indexed, iterated and measured like a list of groups.
+    """
+
+    def __init__(self, members=None, offsets=None, ungrouped=None):
+        """Initialises the class.
+
+        Parameters
+        ----------
+        members : int array, optional
+            Members of every group, stored contiguously.
+        offsets : int array, optional
+            Start of each group in members, with a final entry equal to the length
+            of members.
+        ungrouped : int array, optional
+            Points which are not a member of any group.
+        """
+        if members is None:
+            members = np.array([], dtype='int')
+        if offsets is None:
+            offsets = np.zeros(1, dtype='int')
+        if ungrouped is None:
+            ungrouped = np.array([], dtype='int')
+        self.members = members
+        self.offsets = offsets
+        self.ungrouped = ungrouped
+
+    def set_labels(self, labels, dtype=None):
+        """Builds the catalogue from the group label of each point, with a single
+        stable argsort.
+
+        Parameters
+        ----------
+        labels : int array
+            Group label of each point, -1 means the point is not a member of any group.
+        dtype : dtype, optional
+            Integer dtype of the stored indices, by default int32 or int64
+            depending on the number of points.
+        """
+        labels = np.asarray(labels)
+        if not np.issubdtype(labels.dtype, np.integer):
+            labels = labels.astype('int')
+        dtype = get_label_dtype(len(labels), dtype)
+        order = np.argsort(labels, kind='stable').astype(dtype)
+        sorted_labels = labels[order]
+        N_groups = int(labels.max()) + 1 if len(labels) > 0 else 0
+        offsets = np.searchsorted(sorted_labels, np.arange(N_groups + 1))
+        self.ungrouped = order[:offsets[0]]
+        self.members = order[offsets[0]:]
+        self.offsets = (offsets - offsets[0]).astype(dtype)
+
+    def get_labels(self, Npoint, dtype=None):
+        """Returns the group label of each point.
+
+        Parameters
+        ----------
+        Npoint : int
+            Number of points.
+        dtype : dtype, optional
+            Label dtype, by default int32 or int64 depending on the number of
+            points.
+
+        Returns
+        -------
+        labels : int array
+            Group label of each point, -1 means the point is not a member of any group.
+        """
+        labels = np.full(Npoint, -1, dtype=get_label_dtype(Npoint, dtype))
+        labels[self.members] = np.repeat(np.arange(len(self)), self.get_sizes())
+        return labels
+
+    def get_sizes(self):
+        """Returns the number of members in each group.
+
+        Returns
+        -------
+        sizes : int array
+            Number of members in each group.
+        """
+        return np.diff(self.offsets)
+
+    def get_subset(self, index):
+        """Returns a catalogue of a subset of the groups, in the order given.
+
+        Parameters
+        ----------
+        index : slice, int array or bool array
+            Groups in the subset, as for indexing a numpy array of the groups.
+
+        Returns
+        -------
+        subset : GroupCatalogue
+            Catalogue of the groups in the subset, the ungrouped points are the
+            same as for this catalogue.
+        """
+        index = np.arange(len(self))[index]
+        sizes = self.get_sizes()[index]
+        offsets = np.zeros(len(index) + 1, dtype=np.asarray(self.offsets).dtype)
+        offsets[1:] = np.cumsum(sizes)
+        start = np.asarray(self.offsets)[index]
+        members = np.asarray(self.members)[np.repeat(start - offsets[:-1], sizes) + np.arange(offsets[-1])]
+        return GroupCatalogue(members=members, offsets=offsets, ungrouped=self.ungrouped)
+
+    def save(self, fname):
+        """Saves the catalogue to a .npz file.
+
+        Parameters
+        ----------
+        fname : str
+            File name.
+        """
+        np.savez(fname, members=self.members, offsets=self.offsets, ungrouped=self.ungrouped)
+
+    def load(self, fname):
+        """Loads a catalogue from a .npz file written by save.
+
+        Parameters
+        ----------
+        fname : str
+            File name.
+        """
+        data = np.load(fname)
+        self.members = data['members']
+        self.offsets = data['offsets']
+        self.ungrouped = data['ungrouped']
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if not isinstance(i, (int, np.integer)):
+            return self.get_subset(i)
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError('Group index out of range.')
+        return self.members[self.offsets[i]:self.offsets[i+1]]
+
+    def __iter__(self):
+        for i in range(0, len(self)):
+            yield self.members[self.offsets[i]:self.offsets[i+1]]
+
+
+def labels2catalogue(labels, dtype=None):
+    """Converts the group label of each point to a GroupCatalogue.
+
+    Parameters
+    ----------
+    labels : int array
+        Group label of each point, -1 means the point is not a member of any group.
+    dtype : dtype, optional
+        Integer dtype of the stored indices.
+
+    Returns
+    -------
+    groups : GroupCatalogue
+        The members of each group.
+    """
+    groups = GroupCatalogue()
+    groups.set_labels(labels, dtype=dtype)
+    return groups
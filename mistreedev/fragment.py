@@ -1,5 +1,9 @@
 import numpy as np
 
+from .catalogue import get_label_dtype, labels2catalogue
+from .stats import get_stage
+from .union_find import UnionFind, get_compact_labels, get_merge_tree, cut_merge_tree, get_merge_order
+
 def id2groups(groupID):
     """Returns a list of points in each groups and the ungrouped points.
 
@@ -10,24 +14,37 @@ def id2groups(groupID):
 
     Returns
     -------
-    groups : array
-        A 2 dimensional array object containing the member points or edges in each group.
+    groups : GroupCatalogue
+        The member points or edges in each group.
     ungrouped : array
         A list of ungrouped points or edges.
     """
-    Ngroup = int(groupID.max()) + 1
-    ungrouped = []
-    groups = [[] for i in range(0, Ngroup)]
-    for i in range(0, len(groupID)):
-        if groupID[i] != -1.:
-            groups[int(groupID[i])].append(i)
-        else:
-            ungrouped.append(i)
-    groups = np.array([np.array(groups[i]) for i in range(0, len(groups))], dtype=object)
-    ungrouped = np.array(ungrouped)
+    groups = labels2catalogue(groupID)
+    ungrouped = groups.ungrouped
     return groups, ungrouped
 
 
+def get_range_index(start, stop):
+    """Returns the concatenated indices of several ranges.
+
+    Parameters
+    ----------
+    start, stop : int array
+        Start and end of each range.
+
+    Returns
+    -------
+    index : int array
+        Indices start[0], ..., stop[0]-1, start[1], ..., stop[1]-1, ...
+    range_index : int array
+        The range each index belongs to.
+    """
+    counts = np.maximum(stop - start, 0)
+    range_index = np.repeat(np.arange(len(counts)), counts)
+    index = np.arange(len(range_index)) + np.repeat(start - np.cumsum(counts) + counts, counts)
+    return index, range_index
+
+
 class Fragment:
 
 
@@ -38,9 +55,14 @@ class Fragment:
         self.l_index = None
         self.l_min = None
         self.l_max = None
+        self.sorted_l_ind = None
+        self.sorted_l = None
+        self.merge_parent = None
+        self.merge_first = None
+        self.edge_creates = None
 
 
-    def set_tree(self, Npoint, l, l_index):
+    def set_tree(self, Npoint, l, l_index, stats=None):
         """Sets the tree which we will be fragmenting into different structures.
 
         Parameters
@@ -51,17 +73,45 @@ class Fragment:
             The length of edges int he tree.
         l_index : array
             Two dimensional array containing the index of the points each edge is attached to.
+        stats : StageStats, optional
+            If given the time and peak memory of sorting the edges and building
+            the merge tree are recorded.
         """
-        assert type(Npoint) == np.int, 'Npart must be an integer.'
+        assert isinstance(Npoint, (int, np.integer)), 'Npart must be an integer.'
         assert len(l) == len(l_index[0]), 'Length of the edges array l must be the same as the edges index array l_index[0].'
         self.Npoint = Npoint
         self.l = l
         self.l_index = l_index
         self.l_min = l.min()
         self.l_max = l.max()
+        self.build_index(stats=stats)
+
+
+    def build_index(self, stats=None):
+        """Sorts the edges and builds the single-linkage merge tree once, so that
+        later calls to get_groupID do not need to sort or merge the edges again.
+
+        Parameters
+        ----------
+        stats : StageStats, optional
+            If given the sort and merge stages are recorded.
+        """
+        with get_stage(stats, 'sort'):
+            self.sorted_l_ind = np.argsort(self.l, kind='stable')
+            self.sorted_l = self.l[self.sorted_l_ind]
+        point_ind1 = self.l_index[0][self.sorted_l_ind]
+        point_ind2 = self.l_index[1][self.sorted_l_ind]
+        with get_stage(stats, 'merge'):
+            self.merge_parent, self.merge_first = get_merge_tree(self.Npoint, point_ind1, point_ind2)
+        # an edge is only assigned to a group if one of its points is not already
+        # a member of a group, i.e. it is the first edge attached to that point.
+        first_used = np.zeros(self.Npoint, dtype='int') + len(self.l)
+        np.minimum.at(first_used, point_ind1, np.arange(len(self.l)))
+        np.minimum.at(first_used, point_ind2, np.arange(len(self.l)))
+        self.edge_creates = (first_used[point_ind1] == np.arange(len(self.l))) | (first_used[point_ind2] == np.arange(len(self.l)))
 
 
-    def get_groupID(self, min_linking_length, max_linking_length, groupID=None, edgeID=None):
+    def get_groupID(self, min_linking_length, max_linking_length, groupID=None, edgeID=None, stats=None, label_dtype=None):
         """Groups points in a tree with linking edges between min_linking_length and max_linking_length.
 
         Parameters
@@ -74,6 +124,16 @@ class Fragment:
             Supply the groupID from a previous run to continue group finding.
         edgeID : array
             Supply the groupID for each edge.
+        stats : StageStats, optional
+            If given the time and peak memory of the stages and the number of
+            merges and groups are recorded: 'window' finds the edges between the
+            linking lengths, 'cut' reads groups from the merge tree or 'merge'
+            joins them with a union-find, and 'labels' assigns the group labels.
+            Sorting and merging the whole tree is recorded by set_tree.
+        label_dtype : dtype, optional
+            Dtype of groupID and edgeID, by default int32 or int64 depending on the
+            number of points and edges. Use 'float' for the float output of older
+            versions.
 
         Returns
         -------
@@ -86,87 +146,218 @@ class Fragment:
         assert min_linking_length < max_linking_length, 'Minimum linking length is larger than maximum linking length.'
         if min_linking_length < self.l_min:
             assert max_linking_length < self.l_max, 'Current min_linking_length and max_linking_length leave the tree unchanged.'
-        # sort edges from smallest to largest keeping track of the indexs.
-        which_l = np.arange(len(self.l))
-        sorted_l = np.array(sorted(zip(self.l, which_l)))
-        sorted_l_val = sorted_l[:, 0]
-        sorted_l_ind = sorted_l[:, 1].astype('int')
-        # create arrays to keep track of what points have been used and what
-        # group they belong to, when groupID = 0 means the point does not
-        # belong to a group.
+        if self.sorted_l_ind is None:
+            self.build_index(stats=stats)
+        # sets the range in the sorted edges for which groups will be found.
+        with get_stage(stats, 'window'):
+            start = np.searchsorted(self.sorted_l, min_linking_length, side='left')
+            end = np.searchsorted(self.sorted_l, max_linking_length, side='left')
+        which_l = self.sorted_l_ind[start:end]
+        point_ind1 = self.l_index[0][which_l]
+        point_ind2 = self.l_index[1][which_l]
+        if groupID is None and start == 0:
+            # groups are read directly from the merge tree, groups are ordered by
+            # the first edge that created them.
+            with get_stage(stats, 'cut'):
+                top = cut_merge_tree(self.merge_parent, self.Npoint, end)
+            with get_stage(stats, 'labels'):
+                point_roots = np.zeros(self.Npoint, dtype='int') - 1
+                condition = np.where(top >= self.Npoint)[0]
+                point_roots[condition] = top[condition]
+                edge_roots = np.zeros(len(self.l), dtype='int') - 1
+                condition = np.where(self.edge_creates[:end])[0]
+                edge_roots[which_l[condition]] = top[point_ind1[condition]]
+                labels = get_compact_labels(np.concatenate([point_roots, edge_roots]), self.merge_first)
+                labels = labels.astype(get_label_dtype(len(labels), label_dtype))
+                groupID = labels[:self.Npoint]
+                edgeID = labels[self.Npoint:]
+            if stats is not None:
+                stats.add_count('merges', np.count_nonzero(self.merge_first[self.Npoint:self.Npoint + end] < len(self.l)))
+                stats.add_count('groups', labels.max(initial=-1) + 1)
+            return groupID, edgeID
+        uf = UnionFind(self.Npoint)
+        # ordering key for each group, groups from a previous run keep their
+        # order and new groups are ordered by the first edge that created them.
+        key = np.zeros(self.Npoint, dtype='int') + self.Npoint + len(self.l)
         if groupID is None:
-            groupID = np.zeros(self.Npoint)
-            edgeID = np.zeros(len(self.l))
             # to keep track of the number of groups identified.
             N_groups = 0
+            grouped = np.array([], dtype='int')
+            prev_label = np.array([], dtype='int')
+            edge_grouped = np.array([], dtype='int')
         else:
             assert groupID is not None and edgeID is not None, 'Both groupID and edgeID must be supplied.'
             assert self.Npoint == len(groupID), 'Length of which_group is incompatible with the Tree.'
-            groupID = np.copy(groupID) + 1.
-            edgeID = np.copy(edgeID) + 1.
-            # to keep track of the number of groups identified.
-            N_groups = int(groupID.max())
-        # sets the range in the sorted_l_val for which groups will be found.
-        condition = np.where(self.l < min_linking_length)[0]
-        start = len(condition)
-        condition = np.where(self.l < max_linking_length)[0]
-        end = len(condition)
-        for i in range(start, end):
-            # get the index of the points on either end of each edge.
-            point_ind1 = self.l_index[0][sorted_l_ind[i]]
-            point_ind2 = self.l_index[1][sorted_l_ind[i]]
-            # check if the points are in a group
-            if groupID[point_ind1] == 0. and groupID[point_ind2] == 0.:
-                # both points are not in a group so we create a new group with
-                # these two points
-                N_groups += 1
-                groupID[point_ind1] = N_groups
-                groupID[point_ind2] = N_groups
-                edgeID[sorted_l_ind[i]] = N_groups
-            else:
-                # one of both point are in a group.
-                if groupID[point_ind1] != 0. and groupID[point_ind2] == 0.:
-                    # point 1 is in a group but point 2 is not so we assign point 2
-                    # to the same group as point 1
-                    groupID[point_ind2] = groupID[point_ind1]
-                    edgeID[sorted_l_ind[i]] = groupID[point_ind1]
-                elif groupID[point_ind1] == 0. and groupID[point_ind2] != 0.:
-                    # ditto to above but in reverse.
-                    groupID[point_ind1] = groupID[point_ind2]
-                    edgeID[sorted_l_ind[i]] = groupID[point_ind2]
-                else:
-                    if groupID[point_ind1] != 0. and groupID[point_ind2] != 0.:
-                        # both points are already in groups, so we must merge the groups
-                        # they are in. We merge by assigning them the smallest group value.
-                        # Note: bottlenecks are going to occur here, everything before is
-                        # deterministic and does not require going through the entire array.
-                        if groupID[point_ind1] < groupID[point_ind2]:
-                            # if point 1 is a member of a smaller valued group
-                            # we set all points with point 2's group to point 1's group
-                            assign_index = groupID[point_ind1]
-                            not_assign_index = groupID[point_ind2]
-                            condition = np.where(groupID == groupID[point_ind2])[0]
-                            conditionl = np.where(edgeID == groupID[point_ind2])[0]
-                        else:
-                            # ditto to above but in reverse.
-                            assign_index = groupID[point_ind2]
-                            not_assign_index = groupID[point_ind1]
-                            condition = np.where(groupID == groupID[point_ind1])[0]
-                            conditionl = np.where(edgeID == groupID[point_ind1])[0]
-                        groupID[condition] = assign_index
-                        edgeID[conditionl] = assign_index
-                        # our groups now have a missing group value, to rectify this we subtract
-                        # all groups above the missing group by 1.
-                        condition = np.where(groupID > not_assign_index)[0]
-                        groupID[condition] -= 1.
-                        condition = np.where(edgeID > not_assign_index)[0]
-                        edgeID[condition] -= 1.
-                        N_groups -= 1
-        groupID -= 1.
-        edgeID -= 1.
+            N_groups = int(groupID.max()) + 1
+            grouped = np.where(groupID != -1)[0]
+            prev_label = groupID[grouped].astype('int')
+            edge_grouped = np.where(edgeID != -1)[0]
+        with get_stage(stats, 'merge'):
+            if groupID is not None:
+                # join each previously grouped point to the first member of its group.
+                unique_label, first = np.unique(prev_label, return_index=True)
+                uf.union_edges(grouped, grouped[first][np.searchsorted(unique_label, prev_label)])
+            merged = uf.union_edges(point_ind1, point_ind2)
+            roots = uf.get_roots()
+        if stats is not None:
+            stats.add_count('merges', np.count_nonzero(merged))
+        with get_stage(stats, 'labels'):
+            np.minimum.at(key, roots[grouped], prev_label)
+            np.minimum.at(key, roots[point_ind1], N_groups + np.arange(len(which_l)))
+            # assign compact group labels to points and edges.
+            point_roots = np.zeros(self.Npoint, dtype='int') - 1
+            point_roots[grouped] = roots[grouped]
+            point_roots[point_ind1] = roots[point_ind1]
+            point_roots[point_ind2] = roots[point_ind2]
+            edge_roots = np.zeros(len(self.l), dtype='int') - 1
+            edge_roots[edge_grouped] = roots[self.l_index[0][edge_grouped]]
+            # edges which merge two existing groups are not assigned to a group, i.e.
+            # edges where both points were grouped by previous edges.
+            first_used = np.zeros(self.Npoint, dtype='int') + len(which_l)
+            first_used[grouped] = -1
+            np.minimum.at(first_used, point_ind1, np.arange(len(which_l)))
+            np.minimum.at(first_used, point_ind2, np.arange(len(which_l)))
+            condition = np.where((first_used[point_ind1] == np.arange(len(which_l))) | (first_used[point_ind2] == np.arange(len(which_l))))[0]
+            edge_roots[which_l[condition]] = roots[point_ind1[condition]]
+            labels = get_compact_labels(np.concatenate([point_roots, edge_roots]), key)
+            labels = labels.astype(get_label_dtype(len(labels), label_dtype))
+            groupID = labels[:self.Npoint]
+            edgeID = labels[self.Npoint:]
+        if stats is not None:
+            stats.add_count('groups', labels.max(initial=-1) + 1)
         return groupID, edgeID
 
 
+    def iter_groupID(self, linking_lengths, changed=False, label_dtype=None):
+        """Generator over increasing linking lengths, yielding the groups of points
+        in the tree linked by edges shorter than each linking length.
+
+        The edges are sorted and merged once (see build_index) and the merge tree
+        is ordered depth first, so the points and edges of any group are
+        contiguous ranges. Each step only visits the merge nodes created by the
+        new edges and the points and edges whose label changes, so with
+        changed=True walking the whole hierarchy costs one pass over the edges
+        plus the size of the output. The labels of each step are the same as
+        get_groupID for a minimum linking length below the shortest edge.
+
+        Parameters
+        ----------
+        linking_lengths : array
+            Maximum linking lengths, in increasing order.
+        changed : bool
+            If True only the points and edges whose label changed since the
+            previous step are yielded.
+        label_dtype : dtype, optional
+            Dtype of groupID and edgeID, by default int32 or int64 depending on the
+            number of points and edges.
+
+        Yields
+        ------
+        groupID, edgeID : array
+            Group identification number for each point and edge, -1 means the point
+            or edge is not a member of any group. If changed is True, instead
+            point_index, groupID, edge_index, edgeID are yielded, the index and new
+            label of the points and edges which changed.
+        """
+        linking_lengths = np.atleast_1d(linking_lengths)
+        assert np.all(np.diff(linking_lengths) >= 0.), 'linking_lengths must be in increasing order.'
+        if self.sorted_l_ind is None:
+            self.build_index()
+        Npoint = self.Npoint
+        Nedge = len(self.l)
+        dtype = get_label_dtype(Npoint + Nedge, label_dtype)
+        point_order, point_start, point_count, node_order, node_start, node_count = \
+            get_merge_order(self.merge_parent, Npoint)
+        # the edges of a group are the merge nodes below its top node created by
+        # an edge assigned to a group, in the depth first order.
+        creates = self.edge_creates[node_order]
+        edge_order = self.sorted_l_ind[node_order[creates]]
+        edge_cumsum = np.zeros(Nedge + 1, dtype='int')
+        edge_cumsum[1:] = np.cumsum(creates)
+        # the two nodes joined by each merge node.
+        child = np.where(self.merge_parent != -1)[0]
+        child = child[np.argsort(self.merge_parent[child], kind='stable')]
+        children = np.zeros((Nedge, 2), dtype='int') - 1
+        children[self.merge_parent[child[::2]] - Npoint, 0] = child[::2]
+        children[self.merge_parent[child[1::2]] - Npoint, 1] = child[1::2]
+        # groups are ordered by the first edge that created them (their key), the
+        # label of a group is its position in keys.
+        keys = np.zeros(Npoint, dtype='int')
+        tops = np.zeros(Npoint, dtype='int')
+        N_groups = 0
+        if not changed:
+            groupID = np.full(Npoint, -1, dtype=dtype)
+            edgeID = np.full(Nedge, -1, dtype=dtype)
+        end = 0
+        for linking_length in linking_lengths:
+            start, end = end, max(end, np.searchsorted(self.sorted_l, linking_length, side='left'))
+            # top node of each merge node created by the new edges, parents always
+            # have larger node numbers than their children.
+            node_parent = self.merge_parent[Npoint + start:Npoint + end]
+            node_top = np.arange(end - start)
+            condition = np.where((node_parent != -1) & (node_parent < Npoint + end))[0]
+            node_top[condition] = node_parent[condition] - Npoint - start
+            jump = node_top[node_top]
+            while np.any(jump != node_top):
+                node_top = jump
+                jump = node_top[node_top]
+            merging = np.where(self.merge_first[Npoint + start:Npoint + end] < Nedge)[0]
+            new_tops = Npoint + start + merging[node_top[merging] == merging]
+            # groups joined by the new edges, the group with the smallest key
+            # grows and the others are removed.
+            old_top = children[start + merging].ravel()
+            owner = np.repeat(Npoint + start + node_top[merging], 2)
+            condition = np.where((old_top >= Npoint) & (old_top < Npoint + start))[0]
+            old_top, owner = old_top[condition], owner[condition]
+            old_rank = np.searchsorted(keys[:N_groups], self.merge_first[old_top])
+            grows = self.merge_first[old_top] == self.merge_first[owner]
+            removed = old_rank[~grows]
+            grown_rank, grown_top, grown_old = old_rank[grows], owner[grows], old_top[grows]
+            tops[grown_rank] = grown_top
+            new_tops = new_tops[np.invert(np.isin(new_tops, grown_top))]
+            new_tops = new_tops[np.argsort(self.merge_first[new_tops])]
+            # labels after the first removed group shift down, new groups have
+            # keys after every existing group.
+            first_shift = removed.min() if len(removed) > 0 else N_groups
+            keep = np.ones(N_groups - first_shift, dtype='bool')
+            keep[removed - first_shift] = False
+            shifted = first_shift + np.where(keep)[0]
+            tail_keys = np.concatenate([keys[shifted], self.merge_first[new_tops]])
+            tail_tops = np.concatenate([tops[shifted], new_tops])
+            N_groups = first_shift + len(tail_keys)
+            keys[first_shift:N_groups] = tail_keys
+            tops[first_shift:N_groups] = tail_tops
+            # groups from first_shift on are relabelled in full, groups before it
+            # which grew only relabel their new members.
+            partial = np.where(grown_rank < first_shift)[0]
+            grown_rank, grown_top, grown_old = grown_rank[partial], grown_top[partial], grown_old[partial]
+            label = np.concatenate([np.arange(first_shift, N_groups), grown_rank, grown_rank])
+            point_lo = np.concatenate([point_start[tail_tops], point_start[grown_top],
+                                       point_start[grown_old] + point_count[grown_old]])
+            point_hi = np.concatenate([point_start[tail_tops] + point_count[tail_tops], point_start[grown_old],
+                                       point_start[grown_top] + point_count[grown_top]])
+            index, which = get_range_index(point_lo, point_hi)
+            point_index = point_order[index]
+            point_label = label[which].astype(dtype)
+            edge_lo = np.concatenate([node_start[tail_tops], node_start[grown_top],
+                                      node_start[grown_old] + node_count[grown_old]])
+            edge_hi = np.concatenate([node_start[tail_tops] + node_count[tail_tops], node_start[grown_old],
+                                      node_start[grown_top] + node_count[grown_top]])
+            index, which = get_range_index(edge_cumsum[edge_lo], edge_cumsum[edge_hi])
+            edge_index = edge_order[index]
+            edge_label = label[which].astype(dtype)
+            if changed:
+                order = np.argsort(point_index)
+                point_index, point_label = point_index[order], point_label[order]
+                order = np.argsort(edge_index)
+                edge_index, edge_label = edge_index[order], edge_label[order]
+                yield point_index, point_label, edge_index, edge_label
+            else:
+                groupID[point_index] = point_label
+                edgeID[edge_index] = edge_label
+                yield np.copy(groupID), np.copy(edgeID)
+
+
     def clean(self):
         """Reinitialises the class and resets the class parameters."""
         self.__init__()
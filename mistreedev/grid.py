@@ -0,0 +1,189 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+
+
+def get_grid(pos, linking_length, boxsize=None, max_cells=None):
+    """Sets up a regular grid of cells at least one linking length wide.
+
+    Parameters
+    ----------
+    pos : array
+        Positions, with shape (number of points, number of dimensions).
+    linking_length : float
+        Linking length distance.
+    boxsize : float or array_like, optional
+        Size of a periodic box, the grid then spans the box.
+    max_cells : int, optional
+        Largest number of cells, by default four times the number of points. The
+        cells are made wider if needed so sparse points do not need a huge grid.
+
+    Returns
+    -------
+    pos_min : array
+        Lower edge of the grid.
+    cell_size : array
+        Width of the cells along each axis.
+    ncells : int array
+        Number of cells along each axis.
+    """
+    ndim = pos.shape[1]
+    if max_cells is None:
+        max_cells = 4*max(len(pos), 1)
+    if boxsize is None:
+        pos_min = pos.min(axis=0)
+        extent = pos.max(axis=0) - pos_min
+    else:
+        pos_min = np.zeros(ndim)
+        extent = np.zeros(ndim) + boxsize
+    ncells = np.maximum(np.floor(extent/linking_length), 1).astype('int')
+    while np.prod(ncells.astype('float')) > max_cells:
+        ncells = np.maximum(ncells//2, 1)
+    if boxsize is None:
+        # open grids are padded so the largest point falls inside the last cell.
+        cell_size = np.maximum(extent/ncells, linking_length)*(1. + 1e-10)
+    else:
+        cell_size = extent/ncells
+    return pos_min, cell_size, ncells
+
+
+def get_cell_index(pos, pos_min, cell_size, ncells):
+    """Returns the cell of each point along each axis.
+
+    Parameters
+    ----------
+    pos : array
+        Positions, with shape (number of points, number of dimensions).
+    pos_min, cell_size : array
+        Lower edge of the grid and width of the cells.
+    ncells : int array
+        Number of cells along each axis.
+
+    Returns
+    -------
+    cell : int array
+        Cell index of each point along each axis.
+    """
+    cell = np.floor((pos - pos_min)/cell_size).astype('int')
+    return np.clip(cell, 0, ncells - 1)
+
+
+def get_grid_friends_chunk(sorted_pos, sorted_cell, cell_start, ncells, neighbours, start, end, linking_length,
+                           boxsize=None):
+    """Finds the friends of the grid-sorted points start to end by comparing them
+    to every point in the neighbouring cells.
+
+    Parameters
+    ----------
+    sorted_pos : array
+        Positions sorted by cell.
+    sorted_cell : int array
+        Cell index of each sorted point along each axis.
+    cell_start : int array
+        The sorted points in linear cell i are cell_start[i] to cell_start[i+1].
+    ncells : int array
+        Number of cells along each axis.
+    neighbours : int array
+        Offsets to the neighbouring cells, including the cell itself.
+    start, end : int
+        Range of sorted points.
+    linking_length : float
+        Linking length distance.
+    boxsize : array, optional
+        Size of a periodic box.
+
+    Returns
+    -------
+    index1, index2 : int array
+        Sorted index of the points in each directed pair of friends.
+    """
+    index1, index2 = [], []
+    rows = np.arange(start, end)
+    for offset in neighbours:
+        cell = sorted_cell[start:end] + offset
+        if boxsize is None:
+            valid = np.all((cell >= 0) & (cell < ncells), axis=1)
+        else:
+            cell = np.mod(cell, ncells)
+            valid = np.ones(len(cell), dtype='bool')
+        linear = np.ravel_multi_index(tuple(np.clip(cell, 0, ncells - 1).T), tuple(ncells))
+        first = cell_start[linear]
+        counts = np.where(valid, cell_start[linear + 1] - first, 0)
+        _index1 = np.repeat(rows, counts)
+        _index2 = np.repeat(first, counts) + np.arange(len(_index1)) - np.repeat(np.cumsum(counts) - counts, counts)
+        dpos = sorted_pos[_index2] - sorted_pos[_index1]
+        if boxsize is not None:
+            dpos -= boxsize*np.round(dpos/boxsize)
+        dist2 = np.sum(dpos**2., axis=1)
+        condition = np.where((dist2 <= linking_length**2.) & (_index1 != _index2))[0]
+        index1.append(_index1[condition])
+        index2.append(_index2[condition])
+    return np.concatenate(index1), np.concatenate(index2)
+
+
+def find_friends_grid(pos, linking_length, boxsize=None, n_jobs=1, chunk_size=100000):
+    """Finds friends with a cell-linked-list, points are binned into a grid of cells
+    at least one linking length wide and only compared to points in the adjacent
+    cells. The output is identical to the KDTree search in find_friends_nd.
+
+    Parameters
+    ----------
+    pos : array
+        Positions, with shape (number of points, number of dimensions).
+    linking_length : float
+        Linking length distance.
+    boxsize : float or array_like, optional
+        Size of a periodic box.
+    n_jobs : int
+        Number of threads, the points are processed in chunks which are shared
+        between the threads.
+    chunk_size : int
+        Largest number of points processed at a time.
+
+    Returns
+    -------
+    indptr, indices : int array
+        The friends of each point in CSR format, sorted for each point.
+    """
+    assert linking_length > 0., 'The grid engine requires a positive linking length.'
+    pos = np.asarray(pos, dtype='float64')
+    Npoint, ndim = pos.shape
+    if boxsize is not None:
+        boxsize = np.zeros(ndim) + boxsize
+        pos = np.mod(pos, boxsize)
+    indptr = np.zeros(Npoint + 1, dtype='int')
+    if Npoint == 0:
+        return indptr, np.array([], dtype='int')
+    pos_min, cell_size, ncells = get_grid(pos, linking_length, boxsize=boxsize)
+    cell = get_cell_index(pos, pos_min, cell_size, ncells)
+    # counting sort of the points into cells.
+    linear = np.ravel_multi_index(tuple(cell.T), tuple(ncells))
+    cell_start = np.zeros(np.prod(ncells) + 1, dtype='int')
+    cell_start[1:] = np.cumsum(np.bincount(linear, minlength=np.prod(ncells)))
+    order = np.argsort(linear, kind='stable')
+    sorted_pos = pos[order]
+    sorted_cell = cell[order]
+    # neighbouring cell offsets, in a periodic box with fewer than three cells
+    # along an axis the offsets would repeat a cell.
+    axis_offsets = []
+    for j in range(0, ndim):
+        if boxsize is not None and ncells[j] < 3:
+            axis_offsets.append(list(range(0, ncells[j])))
+        else:
+            axis_offsets.append([-1, 0, 1])
+    neighbours = np.array(list(product(*axis_offsets)), dtype='int')
+    step = max(min(chunk_size, -(-Npoint//(4*n_jobs))), 1) if n_jobs > 1 else max(chunk_size, 1)
+    starts = list(range(0, Npoint, step))
+    ends = [min(start + step, Npoint) for start in starts]
+    args = ([sorted_pos]*len(starts), [sorted_cell]*len(starts), [cell_start]*len(starts), [ncells]*len(starts),
+            [neighbours]*len(starts), starts, ends, [linking_length]*len(starts), [boxsize]*len(starts))
+    if n_jobs > 1:
+        with ThreadPoolExecutor(n_jobs) as pool:
+            results = list(pool.map(get_grid_friends_chunk, *args))
+    else:
+        results = list(map(get_grid_friends_chunk, *args))
+    row = order[np.concatenate([index1 for index1, _ in results])]
+    col = order[np.concatenate([index2 for _, index2 in results])]
+    sort = np.lexsort((col, row))
+    indptr[1:] = np.cumsum(np.bincount(row, minlength=Npoint))
+    return indptr, col[sort]
@@ -1,8 +1,241 @@
+import hashlib
+import os
+
 import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from scipy.spatial import cKDTree
 from sklearn.neighbors import KDTree
 
+from .adjacency import friends2csr, csr2friends, get_component_labels, groups2labels, groups2members
+from .catalogue import get_label_dtype, labels2catalogue
+from .grid import find_friends_grid
+from .parallel import find_groups_parallel
+from .reduction import get_label_stats, get_label_mean_periodic
+from .stats import get_stage
+from .stream import write_catalogue, load_catalogue
+from .tiled import find_groups_tiled
+from .union_find import UnionFind, get_compact_labels
+
+
+# module level least recently used cache of spatial indexes, disabled when
+# maxsize is 0.
+kdtree_cache = {'maxsize': 0, 'trees': OrderedDict()}
+
+
+def set_kdtree_cache(maxsize=0):
+    """Sets the number of spatial indexes kept in the module level cache, so that
+    repeated neighbour searches on the same positions reuse the KDTree.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of cached trees, 0 disables the cache.
+    """
+    kdtree_cache['maxsize'] = maxsize
+    while len(kdtree_cache['trees']) > maxsize:
+        kdtree_cache['trees'].popitem(last=False)
+
+
+def clear_kdtree_cache():
+    """Removes every tree from the module level cache."""
+    kdtree_cache['trees'].clear()
+
+
+def get_array_key(arrays):
+    """Returns a cache key for position arrays from their identity, length, dtype
+    and a hash of all their values, so arrays modified in place get a new key.
+
+    Parameters
+    ----------
+    arrays : list
+        Coordinate arrays.
+
+    Returns
+    -------
+    key : tuple
+        Cache key.
+    """
+    key = []
+    for _x in arrays:
+        _array = np.ascontiguousarray(_x)
+        digest = hashlib.blake2b(_array.view('uint8'), digest_size=16).hexdigest()
+        key.append((id(_x), len(_array), _array.dtype.str, digest))
+    return tuple(key)
+
+
+def wrap_positions(pos, boxsize):
+    """Wraps positions into a periodic box [0, boxsize). np.mod can round
+    coordinates just below zero up to exactly boxsize, these are folded back to
+    zero as cKDTree rejects points on the upper edge of the box.
+
+    Parameters
+    ----------
+    pos : array
+        Positions, with shape (number of points, number of dimensions).
+    boxsize : float or array_like
+        Size of the periodic box.
+
+    Returns
+    -------
+    pos : array
+        Wrapped positions.
+    """
+    boxsize = np.zeros(np.shape(pos)[1]) + boxsize
+    pos = np.mod(pos, boxsize)
+    for j in range(0, len(boxsize)):
+        pos[pos[:, j] >= boxsize[j], j] -= boxsize[j]
+    return pos
+
+
+def get_kdtree(pos, leaf_size=10, boxsize=None, key=None):
+    """Builds the spatial index of a set of points, a KDTree or in a periodic box a
+    cKDTree, or returns it from the module level cache.
+
+    Parameters
+    ----------
+    pos : array
+        Positions, with shape (number of points, number of dimensions).
+    leaf_size : int
+        Leaf size of the tree.
+    boxsize : float or array_like, optional
+        Size of a periodic box.
+    key : tuple, optional
+        Cache key of the positions (see get_array_key), the cache is only used
+        when a key is given and set_kdtree_cache has been called.
+
+    Returns
+    -------
+    tree_data : KDTree or cKDTree
+        Spatial index of the points.
+    """
+    use_cache = key is not None and kdtree_cache['maxsize'] > 0
+    if use_cache:
+        key = key + (leaf_size, None if boxsize is None else tuple(np.zeros(np.shape(pos)[1]) + boxsize))
+        if key in kdtree_cache['trees']:
+            kdtree_cache['trees'].move_to_end(key)
+            return kdtree_cache['trees'][key]
+    if boxsize is None:
+        tree_data = KDTree(pos, leaf_size=leaf_size)
+    else:
+        tree_data = cKDTree(wrap_positions(pos, boxsize), leafsize=leaf_size, boxsize=boxsize)
+    if use_cache:
+        kdtree_cache['trees'][key] = tree_data
+        set_kdtree_cache(kdtree_cache['maxsize'])
+    return tree_data
+
+
+def get_friends_chunk(tree_data, pos, start, end, linking_length, periodic=False):
+    """Queries the friends of the points start to end, returning them as rows of a
+    CSR adjacency with each point removed from its own friends.
+
+    Parameters
+    ----------
+    tree_data : KDTree or cKDTree
+        Spatial index of the points.
+    pos : array
+        Positions, wrapped into the box if periodic.
+    start, end : int
+        Range of points queried.
+    linking_length : float
+        Linking length distance.
+    periodic : bool
+        If True tree_data is a periodic cKDTree.
+
+    Returns
+    -------
+    counts : int array
+        Number of friends of each point.
+    indices : int array
+        The friends of each point, stored contiguously and sorted for each point.
+    """
+    if periodic:
+        friends = tree_data.query_ball_point(pos[start:end], r=linking_length)
+    else:
+        friends = tree_data.query_radius(pos[start:end], r=linking_length)
+    counts = np.fromiter(map(len, friends), dtype='int', count=end - start)
+    row = np.repeat(np.arange(start, end), counts)
+    col = np.concatenate(list(friends) + [np.array([], dtype='int')]).astype('int')
+    condition = np.where(col != row)[0]
+    row = row[condition]
+    col = col[condition]
+    order = np.lexsort((col, row))
+    return np.bincount(row - start, minlength=end - start), col[order]
+
 
-def find_friends_2d(x, y, linking_length):
+def find_friends_nd(pos, linking_length, boxsize=None, stats=None, leaf_size=10, tree_data=None, key=None,
+                    n_jobs=1, chunk_size=100000, engine='kdtree'):
+    """Finds friends for a given set of points in any dimension. This is defined to
+    be points that are a distance=linking_length from a points.
+
+    Parameters
+    ----------
+    pos : array
+        Positions, with shape (number of points, number of dimensions).
+    linking_length : float
+        Linking length distance.
+    boxsize : float or array_like, optional
+        Size of a periodic box, if given distances are computed across the
+        periodic boundaries.
+    stats : StageStats, optional
+        If given the KDTree build and query stages and the number of pairs are
+        recorded.
+    leaf_size : int
+        Leaf size of the tree.
+    tree_data : KDTree or cKDTree, optional
+        A spatial index of pos built with get_kdtree, reused rather than built.
+    key : tuple, optional
+        Cache key of the positions, see get_kdtree.
+    n_jobs : int
+        Number of threads, the points are queried in chunks which are shared
+        between the threads.
+    chunk_size : int
+        Largest number of points queried at a time.
+    engine : str
+        Neighbour search engine, 'kdtree' or 'grid' for a cell-linked-list which
+        is faster for near-uniform points. Both give identical output.
+
+    Returns
+    -------
+    indptr, indices : int array
+        The friends of each point in CSR format, the friends of point i are
+        indices[indptr[i]:indptr[i+1]].
+    """
+    assert engine in ['kdtree', 'grid'], "engine must be 'kdtree' or 'grid'."
+    if engine == 'grid':
+        with get_stage(stats, 'grid'):
+            indptr, indices = find_friends_grid(pos, linking_length, boxsize=boxsize, n_jobs=n_jobs,
+                                                chunk_size=chunk_size)
+        if stats is not None:
+            stats.add_count('pairs', len(indices)//2)
+        return indptr, indices
+    if tree_data is None:
+        with get_stage(stats, 'kdtree_build'):
+            tree_data = get_kdtree(pos, leaf_size=leaf_size, boxsize=boxsize, key=key)
+    with get_stage(stats, 'query_radius'):
+        if boxsize is not None:
+            pos = wrap_positions(pos, boxsize)
+        Npoint = len(pos)
+        # at least a few chunks per thread, so uneven chunks are balanced.
+        step = max(min(chunk_size, -(-Npoint//(4*n_jobs))), 1) if n_jobs > 1 else max(chunk_size, 1)
+        starts = list(range(0, Npoint, step))
+        ends = [min(start + step, Npoint) for start in starts]
+        args = ([tree_data]*len(starts), [pos]*len(starts), starts, ends, [linking_length]*len(starts),
+                [boxsize is not None]*len(starts))
+        if n_jobs > 1:
+            with ThreadPoolExecutor(n_jobs) as pool:
+                results = list(pool.map(get_friends_chunk, *args))
+        else:
+            results = list(map(get_friends_chunk, *args))
+        indptr = np.zeros(Npoint + 1, dtype='int')
+        indptr[1:] = np.cumsum(np.concatenate([counts for counts, _ in results] + [np.array([], dtype='int')]))
+        indices = np.concatenate([_indices for _, _indices in results] + [np.array([], dtype='int')])
+    if stats is not None:
+        stats.add_count('pairs', len(indices)//2)
+    return indptr, indices
+
+
+def find_friends_2d(x, y, linking_length, boxsize=None, stats=None, leaf_size=10, n_jobs=1, engine='kdtree'):
     """Finds friends for a given set of points in 2D. This is defined to be points
     that are a distance=linking_length from a points.
 
@@ -12,6 +245,18 @@ def find_friends_2d(x, y, linking_length):
         Positions
     linking_length : float
         Linking length distance.
+    boxsize : float or array_like, optional
+        Size of a periodic box, if given distances are computed across the
+        periodic boundaries.
+    stats : StageStats, optional
+        If given the neighbour search stages are recorded.
+    leaf_size : int
+        Leaf size of the tree, trees are reused from the module level cache if it
+        is enabled with set_kdtree_cache.
+    n_jobs : int
+        Number of threads used for the neighbour search.
+    engine : str
+        Neighbour search engine, 'kdtree' or 'grid' (cell-linked-list).
 
     Returns
     -------
@@ -19,14 +264,14 @@ def find_friends_2d(x, y, linking_length):
         A list of friends for each given point.
     """
     pos = np.array([x, y]).T
-    tree_data = KDTree(pos, leaf_size=10)
-    friends = tree_data.query_radius(pos, r=linking_length)
-    friends = [sorted(friends[i]) for i in range(0, len(friends))]
-    friends = [np.array(friends[i])[np.where(np.array(friends[i]) != i)[0]] for i in range(0, len(friends))]
+    key = get_array_key([x, y]) if kdtree_cache['maxsize'] > 0 and engine == 'kdtree' else None
+    indptr, indices = find_friends_nd(pos, linking_length, boxsize=boxsize, stats=stats, leaf_size=leaf_size, key=key,
+                                      n_jobs=n_jobs, engine=engine)
+    friends = csr2friends(indptr, indices)
     return friends
 
 
-def find_friends_3d(x, y, z, linking_length):
+def find_friends_3d(x, y, z, linking_length, boxsize=None, stats=None, leaf_size=10, n_jobs=1, engine='kdtree'):
     """Finds friends for a given set of points in 3D. This is defined to be points
     that are a distance=linking_length from a points.
 
@@ -36,6 +281,18 @@ def find_friends_3d(x, y, z, linking_length):
         Positions
     linking_length : float
         Linking length distance.
+    boxsize : float or array_like, optional
+        Size of a periodic box, if given distances are computed across the
+        periodic boundaries.
+    stats : StageStats, optional
+        If given the neighbour search stages are recorded.
+    leaf_size : int
+        Leaf size of the tree, trees are reused from the module level cache if it
+        is enabled with set_kdtree_cache.
+    n_jobs : int
+        Number of threads used for the neighbour search.
+    engine : str
+        Neighbour search engine, 'kdtree' or 'grid' (cell-linked-list).
 
     Returns
     -------
@@ -43,28 +300,184 @@ def find_friends_3d(x, y, z, linking_length):
         A list of friends for each given point.
     """
     pos = np.array([x, y, z]).T
-    tree_data = KDTree(pos, leaf_size=10)
-    friends = tree_data.query_radius(pos, r=linking_length)
-    friends = [sorted(friends[i]) for i in range(0, len(friends))]
-    friends = [np.array(friends[i])[np.where(np.array(friends[i]) != i)[0]] for i in range(0, len(friends))]
+    key = get_array_key([x, y, z]) if kdtree_cache['maxsize'] > 0 and engine == 'kdtree' else None
+    indptr, indices = find_friends_nd(pos, linking_length, boxsize=boxsize, stats=stats, leaf_size=leaf_size, key=key,
+                                      n_jobs=n_jobs, engine=engine)
+    friends = csr2friends(indptr, indices)
     return friends
 
 
-def count_friends(friends):
+def find_pairs_nd(pos, linking_length, boxsize=None):
+    """Finds all pairs of points separated by less than linking_length.
+
+    Parameters
+    ----------
+    pos : array
+        Positions, with shape (number of points, number of dimensions).
+    linking_length : float
+        Linking length distance.
+    boxsize : float or array_like, optional
+        Size of a periodic box, if given distances are computed across the
+        periodic boundaries.
+
+    Returns
+    -------
+    index1, index2 : array
+        Index of the points in each pair, where index1 < index2.
+    dist : array
+        Separation of each pair.
+    """
+    if boxsize is None:
+        tree_data = KDTree(pos, leaf_size=10)
+        friends, friends_dist = tree_data.query_radius(pos, r=linking_length, return_distance=True)
+        return get_pairs(friends, friends_dist)
+    pos = wrap_positions(pos, boxsize)
+    tree_data = cKDTree(pos, leafsize=10, boxsize=boxsize)
+    pairs = tree_data.query_pairs(linking_length, output_type='ndarray')
+    index1 = np.minimum(pairs[:, 0], pairs[:, 1]).astype('int')
+    index2 = np.maximum(pairs[:, 0], pairs[:, 1]).astype('int')
+    dpos = pos[index1] - pos[index2]
+    dpos -= boxsize*np.round(dpos/boxsize)
+    dist = np.sqrt(np.sum(dpos**2., axis=1))
+    return index1, index2, dist
+
+
+def find_pairs_2d(x, y, linking_length, boxsize=None):
+    """Finds all pairs of points in 2D separated by less than linking_length.
+
+    Parameters
+    ----------
+    x, y : array_like
+        Positions
+    linking_length : float
+        Linking length distance.
+    boxsize : float or array_like, optional
+        Size of a periodic box, if given distances are computed across the
+        periodic boundaries.
+
+    Returns
+    -------
+    index1, index2 : array
+        Index of the points in each pair, where index1 < index2.
+    dist : array
+        Separation of each pair.
+    """
+    pos = np.array([x, y]).T
+    return find_pairs_nd(pos, linking_length, boxsize=boxsize)
+
+
+def find_pairs_3d(x, y, z, linking_length, boxsize=None):
+    """Finds all pairs of points in 3D separated by less than linking_length.
+
+    Parameters
+    ----------
+    x, y, z : array_like
+        Positions
+    linking_length : float
+        Linking length distance.
+    boxsize : float or array_like, optional
+        Size of a periodic box, if given distances are computed across the
+        periodic boundaries.
+
+    Returns
+    -------
+    index1, index2 : array
+        Index of the points in each pair, where index1 < index2.
+    dist : array
+        Separation of each pair.
+    """
+    pos = np.array([x, y, z]).T
+    return find_pairs_nd(pos, linking_length, boxsize=boxsize)
+
+
+def get_pairs(friends, friends_dist):
+    """Converts the neighbours of each point to a flat list of unique pairs.
+
+    Parameters
+    ----------
+    friends : list
+        A list of friends for each given point.
+    friends_dist : list
+        The distance to each friend.
+
+    Returns
+    -------
+    index1, index2 : array
+        Index of the points in each pair, where index1 < index2.
+    dist : array
+        Separation of each pair.
+    """
+    counts = np.array([len(friends[i]) for i in range(0, len(friends))], dtype='int')
+    index1 = np.repeat(np.arange(len(friends)), counts)
+    if len(index1) == 0:
+        return index1, np.array([], dtype='int'), np.array([])
+    index2 = np.concatenate(friends)
+    dist = np.concatenate(friends_dist)
+    condition = np.where(index1 < index2)[0]
+    return index1[condition], index2[condition], dist[condition]
+
+
+def get_group_labels_sweep(Npoint, index1, index2, dist, linking_lengths):
+    """Finds the groups for several linking lengths from a single list of pairs,
+    by merging the pairs in order of separation.
+
+    Parameters
+    ----------
+    Npoint : int
+        Number of points.
+    index1, index2 : array
+        Index of the points in each pair.
+    dist : array
+        Separation of each pair.
+    linking_lengths : array_like
+        Linking length distances, which must all be smaller or equal to the
+        distance used to find the pairs.
+
+    Returns
+    -------
+    labels : int array
+        Group label of each point (second axis) for each linking length (first
+        axis), -1 means the point is not a member of any group. Groups are ordered
+        by their first member, i.e. in the same order as get_groups.
+    """
+    linking_lengths = np.atleast_1d(linking_lengths)
+    sorted_dist_ind = np.argsort(dist, kind='stable')
+    sorted_dist = dist[sorted_dist_ind]
+    uf = UnionFind(Npoint)
+    labels = np.zeros((len(linking_lengths), Npoint), dtype='int') - 1
+    start = 0
+    for i in np.argsort(linking_lengths, kind='stable'):
+        end = np.searchsorted(sorted_dist, linking_lengths[i], side='right')
+        if end > start:
+            uf.union_edges(index1[sorted_dist_ind[start:end]], index2[sorted_dist_ind[start:end]])
+            start = end
+        roots = uf.get_roots()
+        # groups are ordered by the smallest index of their members.
+        key = np.zeros(Npoint, dtype='int') + Npoint
+        np.minimum.at(key, roots, np.arange(Npoint))
+        roots[uf.size[roots] == 1] = -1
+        labels[i] = get_compact_labels(roots, key)
+    return labels
+
+
+def count_friends(friends, dtype=None):
     """Gets the friend counts.
 
     Parameters
     ----------
     friends : list
         A list of friends for each given point.
+    dtype : dtype, optional
+        Dtype of the counts, by default int32 or int64 depending on the number of
+        points. Use 'float' for the float counts of older versions.
 
     Returns
     -------
-    counts : list
+    counts : array
         The number of 'friends' for each points.
     """
     counts = [len(friends[i]) for i in range(0, len(friends))]
-    counts = np.array(counts).astype('float')
+    counts = np.array(counts, dtype=get_label_dtype(len(friends), dtype))
     return counts
 
 
@@ -80,23 +493,15 @@ def get_groups(friends, counts):
 
     Returns
     -------
-    groups : list
-        A list of member points in each group.
+    groups : GroupCatalogue
+        The member points in each group.
     """
-    _mask = np.zeros(len(friends))
-    groups = []
-    for j in range(0, len(friends)):
-        if _mask[j] == 0. and counts[j] != 0:
-            group = np.concatenate([np.array([j]), np.array(friends[j])])
-            subgroup = np.unique(np.hstack(np.array([friends[group[k]] for k in range(0, len(group))])))
-            newgroup = np.unique(np.concatenate([group, subgroup]))
-            while len(group) < len(newgroup):
-                group = newgroup
-                subgroup = np.unique(np.hstack(np.array([friends[group[k]] for k in range(0, len(group))])))
-                newgroup = np.unique(np.concatenate([group, subgroup]))
-            groups.append(newgroup)
-            _mask[group] = 1.
-    groups = np.array(groups)
+    # groups are the connected components of the friends graph, points without
+    # friends are not grouped.
+    indptr, indices = friends2csr(friends)
+    labels = get_component_labels(indptr, indices)
+    labels[np.asarray(counts) == 0] = -1
+    groups = labels2catalogue(labels)
     return groups
 
 
@@ -106,7 +511,8 @@ def get_group_param_mean(groups, parameter):
     Parameters
     ----------
     groups : list
-        A list of member points in each group.
+        A list of member points in each group. Groups may overlap, a point in
+        several groups contributes to each of them.
     parameter : array_like
         Parameter value for each point which we want the mean of for each group.
 
@@ -115,7 +521,36 @@ def get_group_param_mean(groups, parameter):
     group_param_mean : array
         The mean parameter for each group.
     """
-    group_param_mean = np.array([np.mean(parameter[groups[i]]) for i in range(0, len(groups))])
+    # statistics are computed over the members of each group rather than a label
+    # per point, so points in several groups are counted in each.
+    members, member_labels = groups2members(groups)
+    group_param_mean = get_label_stats(member_labels, np.asarray(parameter)[members], stats=['mean'],
+                                       N_groups=len(groups))['mean']
+    return group_param_mean
+
+
+def get_group_param_mean_periodic(groups, parameter, boxsize):
+    """Gets the mean of a periodic input value (e.g. a position in a periodic box)
+    for each group, so groups which straddle the boundary get the correct mean.
+
+    Parameters
+    ----------
+    groups : list
+        A list of member points in each group. Groups may overlap, a point in
+        several groups contributes to each of them.
+    parameter : array_like
+        Parameter value for each point which we want the mean of for each group.
+    boxsize : float
+        Period of the parameter.
+
+    Returns
+    -------
+    group_param_mean : array
+        The mean parameter for each group, wrapped to lie between 0 and boxsize.
+    """
+    members, member_labels = groups2members(groups)
+    group_param_mean = get_label_mean_periodic(member_labels, np.asarray(parameter)[members], boxsize,
+                                               N_groups=len(groups))
     return group_param_mean
 
 
@@ -125,7 +560,8 @@ def get_group_param_sum(groups, parameter):
     Parameters
     ----------
     groups : list
-        A list of member points in each group.
+        A list of member points in each group. Groups may overlap, a point in
+        several groups contributes to each of them.
     parameter : array_like
         Parameter value for each point which we want the mean of for each group.
 
@@ -134,7 +570,9 @@ def get_group_param_sum(groups, parameter):
     group_param_sum : array
         The sum parameter for each group.
     """
-    group_param_sum = np.array([np.sum(parameter[groups[i]]) for i in range(0, len(groups))])
+    members, member_labels = groups2members(groups)
+    group_param_sum = get_label_stats(member_labels, np.asarray(parameter)[members], stats=['sum'],
+                                      N_groups=len(groups))['sum']
     return group_param_sum
 
 
@@ -142,15 +580,40 @@ class GroupFinder:
 
     """Group finder class function."""
 
-    def __init__(self):
+    def __init__(self, leaf_size=10, n_jobs=1, engine='kdtree', reuse_tree=False):
+        """Initialises the class.
+
+        Parameters
+        ----------
+        leaf_size : int
+            Leaf size of the KDTree used for the neighbour search.
+        n_jobs : int
+            Number of threads used for the neighbour search.
+        engine : str
+            Neighbour search engine, 'kdtree' or 'grid' for a cell-linked-list.
+        reuse_tree : bool
+            By default the spatial index is only reused by find_friends calls
+            after the same setup. If True it is also kept across calls to setup
+            (e.g. get_catalogue) given the same, unchanged position arrays, which
+            are checked by hashing all their values.
+        """
+        assert engine in ['kdtree', 'grid'], "engine must be 'kdtree' or 'grid'."
+        self.leaf_size = leaf_size
+        self.n_jobs = n_jobs
+        self.engine = engine
+        self.reuse_tree = reuse_tree
+        self.tree_data = None
+        self.tree_key = None
         self.x = None
         self.y = None
         self.z = None
         self.mode = None
+        self.boxsize = None
         self.linking_length = None
         self.friends = None
         self.counts = None
         self.groups = None
+        self.labels = None
         self.x_group = None
         self.y_group = None
         self.z_group = None
@@ -163,22 +626,55 @@ class GroupFinder:
         self.N_groups = None
         self.N_points_in = None
         self.N_points_out = None
+        self.stats = None
+        self.label_dtype = None
+        self.uf = None
+        self.trees = None
+        self.pos_sum = None
 
-    def setup(self, x, y, z=None):
+    def setup(self, x, y, z=None, boxsize=None, dtype=None, label_dtype=None):
         """Input positions in 2D or 3D coordinates.
 
         Parameters
         ----------
         x, y, z : array_like
             Positions given in 2D or 3D (=> z is optional.)
+        boxsize : float or array_like, optional
+            Size of a periodic box, if given groups are found across the periodic
+            boundaries.
+        dtype : dtype, optional
+            If given positions are stored with this dtype, e.g. 'float32' to halve
+            their memory.
+        label_dtype : dtype, optional
+            Dtype of the group labels and friend counts, by default int32 or int64
+            depending on the number of points.
         """
         if z is None:
             self.mode = '2D'
         else:
             self.mode = '3D'
+        if dtype is not None:
+            x = np.asarray(x, dtype=dtype)
+            y = np.asarray(y, dtype=dtype)
+            if z is not None:
+                z = np.asarray(z, dtype=dtype)
         self.x = x
         self.y = y
         self.z = z
+        self.boxsize = boxsize
+        self.label_dtype = label_dtype
+        self.uf = None
+        self.trees = None
+        self.pos_sum = None
+        # the spatial index is only kept if asked for and the same, unchanged
+        # positions are given again.
+        key = None
+        if self.reuse_tree or kdtree_cache['maxsize'] > 0:
+            key = get_array_key([x, y] if z is None else [x, y, z])
+            key += (self.leaf_size, None if boxsize is None else tuple(np.atleast_1d(boxsize)))
+        if not self.reuse_tree or key != self.tree_key:
+            self.tree_data = None
+        self.tree_key = key
 
     def find_friends(self, linking_length):
         """Find 'friends', i.e. points that are a distance 'linking_length' apart.
@@ -189,32 +685,74 @@ class GroupFinder:
             Linking length distance.
         """
         self.linking_length = linking_length
-        if self.mode == '2D':
-            self.friends = find_friends_2d(self.x, self.y, self.linking_length)
-        elif self.mode == '3D':
-            self.friends = find_friends_3d(self.x, self.y, self.z, self.linking_length)
-        else:
+        if self.mode not in ['2D', '3D']:
             print('Mode Error:', self.mode)
+            return
+        # the spatial index is built once and reused for other linking lengths.
+        pos = self.get_batch_pos(0, len(self.x))
+        if self.engine == 'grid':
+            indptr, indices = find_friends_nd(pos, self.linking_length, boxsize=self.boxsize, stats=self.stats,
+                                              n_jobs=self.n_jobs, engine='grid')
+            self.friends = csr2friends(indptr, indices)
+            return
+        if self.tree_data is None:
+            with get_stage(self.stats, 'kdtree_build'):
+                self.tree_data = get_kdtree(pos, leaf_size=self.leaf_size, boxsize=self.boxsize,
+                                            key=self.tree_key[:-2] if self.tree_key is not None else None)
+        indptr, indices = find_friends_nd(pos, self.linking_length, boxsize=self.boxsize, stats=self.stats,
+                                          tree_data=self.tree_data, n_jobs=self.n_jobs)
+        self.friends = csr2friends(indptr, indices)
 
     def count_friends(self):
         """Counts the number of 'friends' for each point."""
-        self.counts = count_friends(self.friends)
+        self.counts = count_friends(self.friends, dtype=self.label_dtype)
 
     def get_groups(self):
         """Creates a catalogue of group members."""
-        self.groups = get_groups(self.friends, self.counts)
+        with get_stage(self.stats, 'get_groups'):
+            self.groups = get_groups(self.friends, self.counts)
+            self.N_groups = len(self.groups)
+            self.labels = groups2labels(self.groups, len(self.x), dtype=self.label_dtype)
+        if self.stats is not None:
+            self.stats.add_count('groups', self.N_groups)
+
+    def get_groups_parallel(self, linking_length, n_workers):
+        """Creates a catalogue of group members, splitting the domain over several
+        worker processes.
+
+        Parameters
+        ----------
+        linking_length : float
+            Linking length distance.
+        n_workers : int
+            Number of worker processes.
+        """
+        assert self.boxsize is None, 'Parallel group finding does not support periodic boxes.'
+        self.linking_length = linking_length
+        self.labels = find_groups_parallel(self.linking_length, self.x, self.y, self.z, n_workers=n_workers)
+        self.labels = self.labels.astype(get_label_dtype(len(self.x), self.label_dtype))
+        self.groups = labels2catalogue(self.labels)
         self.N_groups = len(self.groups)
 
     def get_group_pos(self):
-        """Finds group mean positions."""
-        self.x_group = get_group_param_mean(self.groups, self.x)
-        self.y_group = get_group_param_mean(self.groups, self.y)
-        if self.mode == '3D':
-            self.z_group = get_group_param_mean(self.groups, self.z)
+        """Finds group mean positions, in a periodic box the mean positions are
+        wrapped across the boundaries."""
+        if self.boxsize is None:
+            if self.mode == '3D':
+                self.x_group, self.y_group, self.z_group = get_label_stats(self.labels, [self.x, self.y, self.z],
+                                                                           N_groups=self.N_groups)['mean']
+            else:
+                self.x_group, self.y_group = get_label_stats(self.labels, [self.x, self.y], N_groups=self.N_groups)['mean']
+        else:
+            boxsize = np.zeros(3 if self.mode == '3D' else 2) + self.boxsize
+            self.x_group = get_label_mean_periodic(self.labels, self.x, boxsize[0], N_groups=self.N_groups)
+            self.y_group = get_label_mean_periodic(self.labels, self.y, boxsize[1], N_groups=self.N_groups)
+            if self.mode == '3D':
+                self.z_group = get_label_mean_periodic(self.labels, self.z, boxsize[2], N_groups=self.N_groups)
 
     def get_grouped(self):
         """Finds the positions of points that are group members."""
-        condition = np.where(self.counts != 0.)[0]
+        condition = np.where(self.labels != -1)[0]
         self.N_points_in = len(condition)
         self.x_in = self.x[condition]
         self.y_in = self.y[condition]
@@ -223,13 +761,14 @@ class GroupFinder:
 
     def get_non_grouped(self):
         """Finds the positions of points that are non group members."""
-        condition = np.where(self.counts == 0.)[0]
+        condition = np.where(self.labels == -1)[0]
         self.x_out = self.x[condition]
         self.y_out = self.y[condition]
         if self.mode == '3D':
             self.z_out = self.z[condition]
 
-    def get_catalogue(self, linking_length, x, y, z=None):
+    def get_catalogue(self, linking_length, x, y, z=None, n_workers=1, boxsize=None, stats=None, dtype=None,
+                      label_dtype=None, output=None, ntiles=4):
         """Outputs a catalogue of group mean positions and non-grouped points.
 
         Parameters
@@ -238,17 +777,231 @@ class GroupFinder:
             Linking length distance.
         x, y, z : array_like
             Positions.
+        n_workers : int
+            Number of worker processes, if larger than 1 the domain is split into
+            slabs which are grouped in parallel.
+        boxsize : float or array_like, optional
+            Size of a periodic box.
+        stats : StageStats, optional
+            If given the time and peak memory of the KDTree build, query_radius,
+            get_groups and reductions stages and the number of pairs and groups
+            are recorded.
+        dtype : dtype, optional
+            Dtype of the stored positions, e.g. 'float32'.
+        label_dtype : dtype, optional
+            Dtype of the group labels and friend counts.
+        output : str, optional
+            If given the catalogue is written to memory-mapped .npy files in this
+            directory (see write_catalogue) and returned as read-only memory maps.
+            Groups are then found with find_groups_tiled, which writes the labels
+            straight to labels.npy, so the friends and labels are never held in
+            memory and n_workers is not used. In a periodic box the tiled finder
+            cannot be used, groups are found in memory as usual and only the
+            catalogue is written to disk, so peak memory is not reduced.
+        ntiles : int or list
+            Number of tiles along each axis used by find_groups_tiled when output
+            is given.
 
         Returns
         -------
         x_cat, y_cat, z_cat : array_like
             Positions of groups and non-grouped points.
         """
-        self.setup(x, y, z)
-        self.find_friends(linking_length)
-        self.count_friends()
-        self.get_groups()
-        self.get_group_pos()
+        self.setup(x, y, z, boxsize=boxsize, dtype=dtype, label_dtype=label_dtype)
+        # stats are only recorded for the duration of this call.
+        self.stats = stats
+        try:
+            if output is not None and self.boxsize is None:
+                if not os.path.exists(output):
+                    os.makedirs(output)
+                labels_file = os.path.join(output, 'labels.npy')
+                with get_stage(self.stats, 'find_groups_tiled'):
+                    labels = find_groups_tiled(linking_length, self.x, self.y, self.z, ntiles=ntiles, labels=labels_file)
+                    labels.flush()
+                    del labels
+                pos_cat = self.get_output_catalogue(output, labels_file)
+                if self.stats is not None:
+                    self.stats.add_count('groups', self.N_groups)
+                return pos_cat
+            if n_workers > 1:
+                with get_stage(self.stats, 'get_groups_parallel'):
+                    self.get_groups_parallel(linking_length, n_workers)
+                if self.stats is not None:
+                    self.stats.add_count('groups', self.N_groups)
+            else:
+                self.find_friends(linking_length)
+                self.count_friends()
+                self.get_groups()
+            if output is not None:
+                self.friends = None
+                self.counts = None
+                return self.get_output_catalogue(output, self.labels)
+            with get_stage(self.stats, 'reductions'):
+                self.get_group_pos()
+                self.get_non_grouped()
+            x_cat = np.concatenate([self.x_group, self.x_out])
+            y_cat = np.concatenate([self.y_group, self.y_out])
+            if self.mode == '3D':
+                z_cat = np.concatenate([self.z_group, self.z_out])
+                return x_cat, y_cat, z_cat
+            else:
+                return x_cat, y_cat
+        finally:
+            self.stats = None
+
+    def get_output_catalogue(self, output, labels):
+        """Writes the catalogue to memory-mapped .npy files and reopens them.
+
+        Parameters
+        ----------
+        output : str
+            Output directory.
+        labels : int array or str
+            Group label of each point, or the file name of a .npy file of labels.
+
+        Returns
+        -------
+        x_cat, y_cat, z_cat : memmap
+            Positions of groups and non-grouped points.
+        """
+        with get_stage(self.stats, 'reductions'):
+            write_catalogue(output, labels, self.x, self.y, self.z, boxsize=self.boxsize)
+        catalogue = load_catalogue(output)
+        self.labels = catalogue['labels']
+        self.groups = catalogue['groups']
+        self.N_groups = catalogue['N_groups']
+        if self.mode == '3D':
+            return catalogue['x_cat'], catalogue['y_cat'], catalogue['z_cat']
+        else:
+            return catalogue['x_cat'], catalogue['y_cat']
+
+    def setup_incremental(self):
+        """Builds the union-find, spatial index and group position sums used by
+        add_points from the groups found by get_catalogue."""
+        assert self.boxsize is None, 'Incremental group finding does not support periodic boxes.'
+        pos = self.get_batch_pos(0, len(self.x))
+        Npoint = len(pos)
+        self.uf = UnionFind(Npoint)
+        self.pos_sum = np.copy(pos.T)
+        if self.labels is not None and self.N_groups > 0:
+            # every group member points to the first member of its group.
+            groups = labels2catalogue(self.labels)
+            sizes = groups.get_sizes()
+            first = groups.members[groups.offsets[:-1]]
+            root = np.repeat(first, sizes)
+            self.uf.parent[groups.members] = root
+            self.uf.size[first] = sizes
+            for j in range(0, len(pos[0])):
+                self.pos_sum[j][first] = np.bincount(self.labels[groups.members], weights=pos[groups.members, j],
+                                                     minlength=len(groups))
+        self.trees = []
+        if Npoint > 0:
+            if self.tree_data is None:
+                self.tree_data = KDTree(pos, leaf_size=self.leaf_size)
+            self.trees.append([0, Npoint, self.tree_data])
+
+    def add_points(self, x, y, z=None, linking_length=None):
+        """Adds a batch of points to the groups found by get_catalogue (or to an
+        empty group finder) without rerunning the group finder on all points.
+
+        The spatial index is kept as a list of KDTrees over consecutive batches,
+        which are rebuilt together only when a newer tree is as large, so each
+        point is rebuilt O(log N) times. Only the new points are queried, groups
+        they link are merged in the union-find and the group position sums are
+        updated, so apart from appending to the arrays the cost depends on the
+        batch size rather than the number of points. Rebuilding a tree only reads
+        the positions of the batches being merged, but appending the new points
+        to x, y and z copies these arrays, which is O(N) per call. The groups are
+        read out with get_incremental_catalogue.
+
+        Parameters
+        ----------
+        x, y, z : array_like
+            Positions of the new points.
+        linking_length : float, optional
+            Linking length distance, only needed if no groups have been found yet.
+        """
+        if self.x is None:
+            assert linking_length is not None, 'linking_length must be given for the first batch.'
+            self.setup(np.zeros(0), np.zeros(0), None if z is None else np.zeros(0))
+            self.linking_length = linking_length
+        assert (z is None) == (self.mode == '2D'), 'z must be given for 3D points and only for 3D points.'
+        if self.uf is None:
+            self.setup_incremental()
+        if len(x) == 0:
+            return
+        Nold = len(self.x)
+        self.x = np.concatenate([self.x, x])
+        self.y = np.concatenate([self.y, y])
+        if self.mode == '3D':
+            self.z = np.concatenate([self.z, z])
+        pos_new = self.get_batch_pos(Nold, len(self.x))
+        Nnew = len(pos_new)
+        self.uf.add_points(Nnew)
+        self.pos_sum = np.concatenate([self.pos_sum, pos_new.T], axis=1)
+        # logarithmic method, merge the newest trees while the older tree is not
+        # larger than the newer one.
+        self.trees.append([Nold, Nold + Nnew, None])
+        while len(self.trees) > 1 and self.trees[-2][1] - self.trees[-2][0] <= self.trees[-1][1] - self.trees[-1][0]:
+            start = self.trees[-2][0]
+            end = self.trees.pop()[1]
+            self.trees[-1] = [start, end, None]
+        if self.trees[-1][2] is None:
+            start, end = self.trees[-1][:2]
+            self.trees[-1][2] = KDTree(np.concatenate([self.get_batch_pos(start, Nold), pos_new]), leaf_size=self.leaf_size)
+        index1, index2 = [], []
+        for start, end, tree_data in self.trees:
+            friends = tree_data.query_radius(pos_new, r=self.linking_length)
+            counts = np.array([len(friends[i]) for i in range(0, Nnew)], dtype='int')
+            index1.append(Nold + np.repeat(np.arange(Nnew), counts))
+            index2.append(start + np.concatenate(list(friends) + [np.array([], dtype='int')]).astype('int'))
+        index1 = np.concatenate(index1)
+        index2 = np.concatenate(index2)
+        condition = np.where(index1 != index2)[0]
+        index1, index2 = index1[condition], index2[condition]
+        # move the position sums of the affected sets onto their merged roots.
+        old_roots = np.unique(self.uf.get_roots(np.concatenate([index1, index2])))
+        self.uf.union_edges(index1, index2)
+        new_roots = self.uf.get_roots(old_roots)
+        moved = np.where(new_roots != old_roots)[0]
+        for j in range(0, len(self.pos_sum)):
+            np.add.at(self.pos_sum[j], new_roots[moved], self.pos_sum[j][old_roots[moved]])
+            self.pos_sum[j][old_roots[moved]] = 0.
+        self.labels = None
+        self.groups = None
+        self.tree_data = None
+        self.tree_key = None
+
+    def get_batch_pos(self, start, end):
+        """Returns the positions of points start to end, with shape (number of
+        points, number of dimensions)."""
+        if self.mode == '3D':
+            return np.array([self.x[start:end], self.y[start:end], self.z[start:end]], dtype='float64').T
+        return np.array([self.x[start:end], self.y[start:end]], dtype='float64').T
+
+    def get_incremental_catalogue(self):
+        """Outputs the catalogue of group mean positions and non-grouped points of
+        the points added with add_points, in the same order as get_catalogue.
+
+        Returns
+        -------
+        x_cat, y_cat, z_cat : array_like
+            Positions of groups and non-grouped points.
+        """
+        roots = self.uf.get_roots()
+        roots[self.uf.size[roots] == 1] = -1
+        key = np.arange(len(roots))
+        np.minimum.at(key, roots[roots != -1], np.where(roots != -1)[0])
+        self.labels = get_compact_labels(roots, key).astype(get_label_dtype(len(roots), self.label_dtype))
+        self.groups = labels2catalogue(self.labels)
+        self.N_groups = len(self.groups)
+        first = self.groups.members[self.groups.offsets[:-1]]
+        root = roots[first]
+        pos_mean = self.pos_sum[:, root]/self.uf.size[root]
+        if self.mode == '3D':
+            self.x_group, self.y_group, self.z_group = pos_mean
+        else:
+            self.x_group, self.y_group = pos_mean
         self.get_non_grouped()
         x_cat = np.concatenate([self.x_group, self.x_out])
         y_cat = np.concatenate([self.y_group, self.y_out])
@@ -258,6 +1011,34 @@ class GroupFinder:
         else:
             return x_cat, y_cat
 
+    def get_labels_sweep(self, linking_lengths, x, y, z=None, boxsize=None):
+        """Finds the group labels of each point for several linking lengths, using
+        a single neighbour search at the largest linking length.
+
+        Parameters
+        ----------
+        linking_lengths : array_like
+            Linking length distances.
+        x, y, z : array_like
+            Positions.
+        boxsize : float or array_like, optional
+            Size of a periodic box.
+
+        Returns
+        -------
+        labels : int array
+            Group label of each point (second axis) for each linking length (first
+            axis), -1 means the point is not a member of any group.
+        """
+        self.setup(x, y, z, boxsize=boxsize)
+        linking_lengths = np.atleast_1d(linking_lengths)
+        if self.mode == '2D':
+            index1, index2, dist = find_pairs_2d(self.x, self.y, linking_lengths.max(), boxsize=self.boxsize)
+        else:
+            index1, index2, dist = find_pairs_3d(self.x, self.y, self.z, linking_lengths.max(), boxsize=self.boxsize)
+        labels = get_group_labels_sweep(len(self.x), index1, index2, dist, linking_lengths)
+        return labels
+
     def clean(self):
-        """Reset internal parameters."""
-        self.__init__()
+        """Reset internal parameters, including the cached spatial index."""
+        self.__init__(leaf_size=self.leaf_size, n_jobs=self.n_jobs, engine=self.engine, reuse_tree=self.reuse_tree)
@@ -1,18 +1,62 @@
 import numpy as np
+from sklearn.neighbors import KDTree
 
+try:
+    from . import utility_near_mst
+except ImportError:
+    utility_near_mst = None
 
-def dist_from_line(x0, y0, z0, x1, y1, z1, xr, yr, zr):
+
+# which backend dist_from_line uses, either 'auto', 'numpy' or 'fortran'.
+backend = {'name': 'auto'}
+
+
+def set_backend(name='auto'):
+    """ Sets the backend used to compute distances from lines.
+
+    Parameters
+    ----------
+    name : str
+        'fortran' uses the compiled utility_near_mst module, 'numpy' uses numpy
+        and 'auto' uses the compiled module when it is available and falls back
+        to numpy otherwise.
+    """
+    assert name in ['auto', 'numpy', 'fortran'], "Backend must be 'auto', 'numpy' or 'fortran'."
+    if name == 'fortran':
+        assert utility_near_mst is not None, 'The compiled utility_near_mst module is not available.'
+    backend['name'] = name
+
+
+def get_backend():
+    """ Returns the backend used to compute distances from lines.
+
+    Returns
+    -------
+    name : str
+        Either 'fortran' or 'numpy'.
+    """
+    if backend['name'] == 'auto':
+        if utility_near_mst is None:
+            return 'numpy'
+        return 'fortran'
+    return backend['name']
+
+
+def dist_from_line(x0, y0, z0, x1, y1, z1, xr, yr, zr, use_backend=None):
     """ Finds the perpendicular and parallel distance from a line, not the distance
     from the line is given in units of the lines length.
 
     Parameters
     ----------
-    x0, y0, z0 : float
-        The coordinate of one end of the line.
-    x1, y1, z1 : float
-        The coordinate of the other end of the line.
+    x0, y0, z0 : float/array_like
+        The coordinate of one end of the line, or of the line for each point.
+    x1, y1, z1 : float/array_like
+        The coordinate of the other end of the line, or of the line for each point.
     xr, yr, zr : array_like
         The points we wish to check the distance to the line.
+    use_backend : str, optional
+        Force the 'numpy' or 'fortran' backend, by default the backend given by
+        get_backend is used.
 
     Returns
     -------
@@ -22,6 +66,17 @@ def dist_from_line(x0, y0, z0, x1, y1, z1, xr, yr, zr):
     dist_perp : array_like
         The distance of points perpendicular to the line.
     """
+    if use_backend is None:
+        use_backend = get_backend()
+    else:
+        assert use_backend in ['numpy', 'fortran'], "Backend must be 'numpy' or 'fortran'."
+        assert use_backend == 'numpy' or utility_near_mst is not None, 'The compiled utility_near_mst module is not available.'
+    if use_backend == 'fortran' and np.ndim(xr) == 1:
+        xr, yr, zr = [np.asarray(_x, dtype='float64') for _x in [xr, yr, zr]]
+        if np.ndim(x0) == 0:
+            return utility_near_mst.dist_from_line(x0, y0, z0, x1, y1, z1, xr, yr, zr)
+        x0, y0, z0, x1, y1, z1 = [np.asarray(_x, dtype='float64') for _x in [x0, y0, z0, x1, y1, z1]]
+        return utility_near_mst.dist_from_lines(x0, y0, z0, x1, y1, z1, xr, yr, zr)
     a = x1 - x0
     b = y1 - y0
     c = z1 - z0
@@ -58,6 +113,203 @@ def count_in_cylinder(dist_para, dist_perp, rmax):
         counts = float(len(condition2))
     else:
         _bin_edges = np.concatenate([np.array([0.]), np.array(sorted(rmax))])
-        counts, bin_edges = np.histogram(dist_perp[condition1], bins=_bin_edges, normed=False)
+        counts, bin_edges = np.histogram(dist_perp[condition1], bins=_bin_edges)
         counts = np.cumsum(counts)
     return counts
+
+
+def get_cylinder_candidates(tree_data, pos, pos0, pos1, rmax, para_min=0., para_max=1.):
+    """ Finds the points near a set of edges and their parallel and perpendicular
+    distance from each edge. Candidates are shortlisted with ball queries around
+    a chain of points spaced at most 4*rmax apart along each edge, the union of
+    the balls (of radius at most rmax*sqrt(5)) encloses the cylinder of radius
+    rmax between the parallel distances para_min and para_max. The shortlist of
+    a long edge then grows with the cylinder volume rather than the volume of a
+    sphere around the whole edge.
+
+    Parameters
+    ----------
+    tree_data : KDTree
+        KDTree of the positions.
+    pos : array
+        Positions of the points.
+    pos0, pos1 : array
+        The coordinates of either end of each edge.
+    rmax : float
+        The radius of the cylinder.
+    para_min, para_max : float
+        The range of parallel distances, in units of each edge's length.
+
+    Returns
+    -------
+    which_edge, which_point : int array
+        Index of the edge and point for each candidate.
+    dist_para : array
+        The distance of each candidate parallel to its edge given in units of
+        the edge's length.
+    dist_perp : array
+        The distance of each candidate perpendicular to its edge.
+    """
+    length = np.sqrt(np.sum((pos1 - pos0)**2., axis=1))
+    extent = (para_max - para_min)*length
+    # each ball covers a section of the cylinder of half length at most 2*rmax,
+    # shorter sections shortlist fewer points but need more ball queries.
+    if rmax > 0.:
+        nballs = np.maximum(np.ceil(extent/(4.*rmax)), 1).astype('int')
+    else:
+        nballs = np.ones(len(length), dtype='int')
+    ball_edge = np.repeat(np.arange(len(length)), nballs)
+    ball_index = np.arange(len(ball_edge)) - np.repeat(np.cumsum(nballs) - nballs, nballs)
+    ball_para = para_min + (para_max - para_min)*(ball_index + 0.5)/nballs[ball_edge]
+    centre = pos0[ball_edge] + ball_para[:, np.newaxis]*(pos1 - pos0)[ball_edge]
+    half_length = 0.5*extent[ball_edge]/nballs[ball_edge]
+    radius = np.sqrt(half_length**2. + rmax**2.)
+    candidates = tree_data.query_radius(centre, r=radius)
+    ncandidates = np.array([len(candidates[j]) for j in range(0, len(candidates))], dtype='int')
+    which_edge = np.repeat(ball_edge, ncandidates)
+    if len(which_edge) == 0:
+        return which_edge, np.array([], dtype='int'), np.array([]), np.array([])
+    which_point = np.concatenate(candidates).astype('int')
+    # points in the overlap of neighbouring balls are kept once.
+    if len(nballs) > 0 and nballs.max() > 1:
+        pair = np.unique(which_edge*len(pos) + which_point)
+        which_edge, which_point = pair//len(pos), pair % len(pos)
+    dist_para, dist_perp = dist_from_line(pos0[which_edge, 0], pos0[which_edge, 1], pos0[which_edge, 2],
+                                          pos1[which_edge, 0], pos1[which_edge, 1], pos1[which_edge, 2],
+                                          pos[which_point, 0], pos[which_point, 1], pos[which_point, 2])
+    return which_edge, which_point, dist_para, dist_perp
+
+
+def count_in_cylinders(x, y, z, edge_index, rmax, chunk_size=10000):
+    """ Counts the number of points in a cylinder around every edge, i.e. a
+    distance rmax from each edge with a parallel distance between 0 and 1.
+
+    Candidate points are shortlisted with KDTree ball queries along each edge
+    which together enclose the cylinder (see get_cylinder_candidates), so
+    distances are only computed for nearby points.
+
+    Parameters
+    ----------
+    x, y, z : array_like
+        Positions of the points.
+    edge_index : array
+        A 2 dimensional array containing the index of the points at either end
+        of each edge.
+    rmax : float/array_like
+        The radius of the cylinder or radiuses of cylinders if input is an array.
+    chunk_size : int
+        Number of edges processed at a time.
+
+    Returns
+    -------
+    counts : array
+        Number of points within the cylinder of each edge or if rmax is an array
+        then the number of points in each cylinder, with shape (number of edges,
+        number of rmax).
+    """
+    pos = np.array([x, y, z]).T
+    edge_index = np.asarray(edge_index).astype('int')
+    Nedge = len(edge_index[0])
+    _rmax = np.atleast_1d(rmax).astype('float')
+    tree_data = KDTree(pos, leaf_size=10)
+    counts = np.zeros((Nedge, len(_rmax)))
+    for i in range(0, Nedge, chunk_size):
+        pos0 = pos[edge_index[0][i:i+chunk_size]]
+        pos1 = pos[edge_index[1][i:i+chunk_size]]
+        which_edge, which_point, dist_para, dist_perp = get_cylinder_candidates(tree_data, pos, pos0, pos1, _rmax.max())
+        for j in range(0, len(_rmax)):
+            condition = np.where((dist_para >= 0.) & (dist_para <= 1.) & (dist_perp <= _rmax[j]))[0]
+            counts[i:i+chunk_size, j] = np.bincount(which_edge[condition], minlength=len(pos0))
+    if np.isscalar(rmax) is True:
+        counts = counts[:, 0]
+    return counts
+
+
+def get_bin_index(value, bin_edges):
+    """ Returns the histogram bin of each value, with the same convention as
+    np.histogram (the last bin includes its upper edge).
+
+    Parameters
+    ----------
+    value : array
+        Values to bin.
+    bin_edges : array
+        Monotonically increasing bin edges.
+
+    Returns
+    -------
+    index : int array
+        Bin of each value, -1 means the value is outside the bins.
+    """
+    index = np.searchsorted(bin_edges, value, side='right') - 1
+    index[value == bin_edges[-1]] = len(bin_edges) - 2
+    index[(index < 0) | (index >= len(bin_edges) - 1)] = -1
+    return index
+
+
+def get_cylinder_profile(x, y, z, edge_index, para_bins, perp_bins, weights=None, per_edge=False, chunk_size=10000):
+    """ Computes the 2D distribution of points in parallel and perpendicular
+    distance around edges, stacked over all edges.
+
+    Edges are streamed in chunks and their counts accumulated into preallocated
+    histograms, so distances are never stored for every edge at once.
+
+    Parameters
+    ----------
+    x, y, z : array_like
+        Positions of the points.
+    edge_index : array
+        A 2 dimensional array containing the index of the points at either end
+        of each edge.
+    para_bins : array
+        Bin edges of the parallel distance, in units of each edge's length.
+    perp_bins : array
+        Bin edges of the perpendicular distance.
+    weights : array, optional
+        Weight of each point.
+    per_edge : bool
+        If True the profile of each edge is also returned.
+    chunk_size : int
+        Number of edges processed at a time.
+
+    Returns
+    -------
+    profile : array
+        The stacked (weighted) counts, with shape (len(para_bins)-1, len(perp_bins)-1).
+    profile_edges : array
+        Only returned if per_edge is True, the (weighted) counts for each edge
+        with shape (number of edges, len(para_bins)-1, len(perp_bins)-1).
+    """
+    pos = np.array([x, y, z]).T
+    edge_index = np.asarray(edge_index).astype('int')
+    para_bins = np.asarray(para_bins).astype('float')
+    perp_bins = np.asarray(perp_bins).astype('float')
+    Nedge = len(edge_index[0])
+    Npara = len(para_bins) - 1
+    Nperp = len(perp_bins) - 1
+    tree_data = KDTree(pos, leaf_size=10)
+    profile = np.zeros(Npara*Nperp)
+    if per_edge:
+        profile_edges = np.zeros((Nedge, Npara*Nperp))
+    for i in range(0, Nedge, chunk_size):
+        pos0 = pos[edge_index[0][i:i+chunk_size]]
+        pos1 = pos[edge_index[1][i:i+chunk_size]]
+        which_edge, which_point, dist_para, dist_perp = get_cylinder_candidates(tree_data, pos, pos0, pos1, perp_bins[-1],
+                                                                                para_min=para_bins[0], para_max=para_bins[-1])
+        para_index = get_bin_index(dist_para, para_bins)
+        perp_index = get_bin_index(dist_perp, perp_bins)
+        condition = np.where((para_index != -1) & (perp_index != -1))[0]
+        bin_index = para_index[condition]*Nperp + perp_index[condition]
+        if weights is None:
+            _weights = None
+        else:
+            _weights = np.asarray(weights)[which_point[condition]]
+        profile += np.bincount(bin_index, weights=_weights, minlength=Npara*Nperp)
+        if per_edge:
+            profile_edges[i:i+chunk_size] = np.bincount(which_edge[condition]*Npara*Nperp + bin_index, weights=_weights,
+                                                        minlength=len(pos0)*Npara*Nperp).reshape(len(pos0), Npara*Nperp)
+    profile = profile.reshape(Npara, Nperp)
+    if per_edge:
+        profile_edges = profile_edges.reshape(Nedge, Npara, Nperp)
+        return profile, profile_edges
+    return profile
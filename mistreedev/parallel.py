@@ -0,0 +1,106 @@
+import numpy as np
+from multiprocessing import Pool
+from multiprocessing import shared_memory
+
+from .catalogue import get_label_dtype
+from .tiled import get_tile_labels, set_tile_labels, stitch_tile_labels
+
+
+def get_slab_labels(args):
+    """Runs friends-of-friends on the points of one slab and a halo of one linking
+    length around it, reading positions from shared memory. This is the function
+    run by each worker in find_groups_parallel.
+
+    Parameters
+    ----------
+    args : tuple
+        The shared memory name, the shape of the positions array, the lower and
+        upper edge of the slab along the first axis, whether the slab is the last
+        and the linking length.
+
+    Returns
+    -------
+    core_index, halo_index : int array
+        Index of points inside the slab and in its halo.
+    core_labels, halo_labels : int array
+        Local group label of the core and halo points, -1 means the point is not
+        a member of any group.
+    """
+    shm_name, shape, slab_lo, slab_hi, slab_last, linking_length = args
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        pos = np.ndarray(shape, dtype='float64', buffer=shm.buf)
+        if slab_last:
+            in_core = (pos[:, 0] >= slab_lo) & (pos[:, 0] <= slab_hi)
+        else:
+            in_core = (pos[:, 0] >= slab_lo) & (pos[:, 0] < slab_hi)
+        in_halo = (pos[:, 0] >= slab_lo - linking_length) & (pos[:, 0] <= slab_hi + linking_length)
+        in_halo &= np.invert(in_core)
+        core_index = np.where(in_core)[0]
+        halo_index = np.where(in_halo)[0]
+        labels = get_tile_labels(pos[core_index], pos[halo_index], linking_length)
+    finally:
+        del pos
+        shm.close()
+    return core_index, labels[:len(core_index)], halo_index, labels[len(core_index):]
+
+
+def find_groups_parallel(linking_length, x, y, z=None, n_workers=2):
+    """Friends-of-friends group finding split over several processes.
+
+    The domain is split into slabs along x with an equal number of points. Each
+    worker finds the groups inside one slab and a halo of one linking length
+    around it, reading positions from shared memory, and groups which cross slab
+    boundaries are merged in a final reduction. The labels are identical to a
+    serial run.
+
+    Parameters
+    ----------
+    linking_length : float
+        Linking length distance.
+    x, y, z : array_like
+        Positions given in 2D or 3D (=> z is optional).
+    n_workers : int
+        Number of worker processes.
+
+    Returns
+    -------
+    labels : int array
+        Group label of each point, -1 means the point is not a member of any
+        group. Groups are ordered by their first member, i.e. in the same order
+        as get_groups.
+    """
+    if z is None:
+        pos = np.array([x, y], dtype='float64').T
+    else:
+        pos = np.array([x, y, z], dtype='float64').T
+    Npoint = len(pos)
+    slab_edges = np.quantile(pos[:, 0], np.linspace(0., 1., n_workers + 1))
+    shm = shared_memory.SharedMemory(create=True, size=max(pos.nbytes, 1))
+    try:
+        shared_pos = np.ndarray(pos.shape, dtype='float64', buffer=shm.buf)
+        shared_pos[:] = pos
+        del pos
+        args = [(shm.name, shared_pos.shape, slab_edges[i], slab_edges[i+1], i == n_workers - 1, linking_length)
+                for i in range(0, n_workers)]
+        with Pool(n_workers) as pool:
+            results = pool.map(get_slab_labels, args)
+        del shared_pos
+    finally:
+        shm.close()
+        shm.unlink()
+    # groups inside a slab are labelled directly, groups crossing slabs are
+    # linked through their halo points.
+    labels = np.zeros(Npoint, dtype=get_label_dtype(Npoint))
+    N_boundary = 0
+    boundary_key, link_group, link_index = [], [], []
+    for core_index, core_labels, halo_index, halo_labels in results:
+        _boundary_key, _link_group, _link_index = set_tile_labels(labels, core_index, halo_index,
+                                                                  np.concatenate([core_labels, halo_labels]),
+                                                                  N_boundary)
+        N_boundary += len(_boundary_key)
+        boundary_key.append(_boundary_key)
+        link_group.append(_link_group)
+        link_index.append(_link_index)
+    labels = stitch_tile_labels(labels, boundary_key, link_group, link_index, chunk_size=max(Npoint, 1))
+    return labels
@@ -0,0 +1,117 @@
+import numpy as np
+
+
+def get_label_stats(labels, params, weights=None, stats=None, N_groups=None):
+    """Computes statistics of one or several parameters for each group from the
+    group label of each point, using bincount and reduceat kernels rather than a
+    loop over groups.
+
+    Parameters
+    ----------
+    labels : int array
+        Group label of each point, -1 means the point is not a member of any group.
+    params : array or list
+        Parameter value for each point, or a list of parameters.
+    weights : array, optional
+        Weights for each point, required for the weighted mean 'wmean'.
+    stats : list, optional
+        Statistics to compute, any of 'count', 'sum', 'mean', 'wmean', 'var',
+        'min' and 'max', by default only the 'mean'. The variance is the
+        population variance (ddof=0).
+    N_groups : int, optional
+        Number of groups, by default the largest label + 1.
+
+    Returns
+    -------
+    group_stats : dict
+        Dictionary of the requested statistics. 'count' is an array of length
+        N_groups, the others have shape (number of parameters, N_groups) or
+        length N_groups if params is a single array. Groups without members are
+        given nan.
+    """
+    if stats is None:
+        stats = ['mean']
+    labels = np.asarray(labels)
+    single = np.ndim(params) == 1
+    if single:
+        params = [params]
+    if N_groups is None:
+        N_groups = int(labels.max()) + 1 if len(labels) > 0 else 0
+    condition = np.where(labels != -1)[0]
+    _labels = labels[condition]
+    _params = [np.asarray(params[i])[condition] for i in range(0, len(params))]
+    count = np.bincount(_labels, minlength=N_groups).astype('float')
+    group_stats = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if 'count' in stats:
+            group_stats['count'] = count
+        if 'sum' in stats or 'mean' in stats or 'var' in stats:
+            _sum = np.array([np.bincount(_labels, weights=_params[i], minlength=N_groups) for i in range(0, len(_params))])
+            _mean = _sum/count
+            if 'sum' in stats:
+                group_stats['sum'] = _sum
+            if 'mean' in stats:
+                group_stats['mean'] = _mean
+            if 'var' in stats:
+                group_stats['var'] = np.array([np.bincount(_labels, weights=(_params[i] - _mean[i][_labels])**2.,
+                                                           minlength=N_groups) for i in range(0, len(_params))])/count
+        if 'wmean' in stats:
+            assert weights is not None, 'weights must be supplied for the weighted mean.'
+            _weights = np.asarray(weights)[condition]
+            _weights_sum = np.bincount(_labels, weights=_weights, minlength=N_groups)
+            group_stats['wmean'] = np.array([np.bincount(_labels, weights=_params[i]*_weights, minlength=N_groups)
+                                             for i in range(0, len(_params))])/_weights_sum
+    if 'min' in stats or 'max' in stats:
+        # sort by label once, then reduce over the contiguous segments.
+        order = np.argsort(_labels, kind='stable')
+        offsets = np.searchsorted(_labels[order], np.arange(N_groups))
+        has_members = count > 0
+        for stat, ufunc in [('min', np.minimum), ('max', np.maximum)]:
+            if stat in stats:
+                group_stats[stat] = np.zeros((len(_params), N_groups)) + np.nan
+                if len(_labels) > 0:
+                    for i in range(0, len(_params)):
+                        group_stats[stat][i][has_members] = ufunc.reduceat(_params[i][order], offsets[has_members])
+    if single:
+        for stat in group_stats:
+            if stat != 'count':
+                group_stats[stat] = group_stats[stat][0]
+    return group_stats
+
+
+def get_label_mean_periodic(labels, param, boxsize, N_groups=None):
+    """Computes the mean of a periodic parameter (e.g. a position in a periodic
+    box) for each group from the group label of each point.
+
+    Parameters
+    ----------
+    labels : int array
+        Group label of each point, -1 means the point is not a member of any group.
+    param : array
+        Parameter value for each point.
+    boxsize : float
+        Period of the parameter.
+    N_groups : int, optional
+        Number of groups, by default the largest label + 1.
+
+    Returns
+    -------
+    group_param_mean : array
+        The mean parameter for each group, wrapped to lie between 0 and boxsize.
+    """
+    labels = np.asarray(labels)
+    param = np.asarray(param)
+    if N_groups is None:
+        N_groups = int(labels.max()) + 1 if len(labels) > 0 else 0
+    condition = np.where(labels != -1)[0]
+    # separations are measured from the first member of each group, using the
+    # nearest periodic image.
+    first = np.zeros(N_groups, dtype='int') + len(labels)
+    np.minimum.at(first, labels[condition], condition)
+    param_ref = np.zeros(N_groups)
+    has_members = first < len(labels)
+    param_ref[has_members] = param[first[has_members]]
+    dparam = np.mod(param[condition] - param_ref[labels[condition]] + 0.5*boxsize, boxsize) - 0.5*boxsize
+    group_stats = get_label_stats(labels[condition], dparam, stats=['mean'], N_groups=N_groups)
+    group_param_mean = np.mod(param_ref + group_stats['mean'], boxsize)
+    return group_param_mean
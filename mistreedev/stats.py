@@ -0,0 +1,114 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+
+class StageStats:
+
+    """Opt-in record of the wall time, peak allocated memory and counts of each
+    stage of a calculation, e.g. the KDTree build and query of the group finder.
+
+    Stages are timed in sequence (they are not nested). Peak memory is measured
+    with tracemalloc, which is started for the duration of a stage if it is not
+    already running.
+    """
+
+    def __init__(self, track_memory=True, callback=None):
+        """Initialises the class.
+
+        Parameters
+        ----------
+        track_memory : bool
+            If True the peak memory allocated in each stage is recorded.
+        callback : function, optional
+            Called as callback(stage, record) at the end of each stage, where
+            record is the dictionary of the stage time and peak memory.
+        """
+        self.track_memory = track_memory
+        self.callback = callback
+        self.stages = {}
+        self.counts = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager which records the wall time and peak allocated memory of
+        a stage, repeated stages with the same name are accumulated.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage.
+        """
+        started = False
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started = True
+            tracemalloc.reset_peak()
+            memory0 = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = self.stages.setdefault(name, {'time': 0., 'peak_memory': 0, 'calls': 0})
+            record['time'] += time.perf_counter() - t0
+            record['calls'] += 1
+            if self.track_memory:
+                record['peak_memory'] = max(record['peak_memory'], tracemalloc.get_traced_memory()[1] - memory0)
+                if started:
+                    tracemalloc.stop()
+            if self.callback is not None:
+                self.callback(name, record)
+
+    def add_count(self, name, value):
+        """Adds to a named count, e.g. the number of pairs or groups.
+
+        Parameters
+        ----------
+        name : str
+            Name of the count.
+        value : int
+            Value added to the count.
+        """
+        self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def to_dict(self):
+        """Returns the stages and counts as a dictionary."""
+        return {'stages': self.stages, 'counts': self.counts}
+
+    def to_json(self, fname=None):
+        """Returns the stages and counts as a JSON string, and writes them to a file
+        if fname is given.
+
+        Parameters
+        ----------
+        fname : str, optional
+            File name.
+        """
+        output = json.dumps(self.to_dict(), indent=2)
+        if fname is not None:
+            with open(fname, 'w') as f:
+                f.write(output)
+        return output
+
+    def clean(self):
+        """Resets the recorded stages and counts."""
+        self.stages = {}
+        self.counts = {}
+
+
+def get_stage(stats, name):
+    """Returns the stage context manager of stats, or a context manager which does
+    nothing if stats is None.
+
+    Parameters
+    ----------
+    stats : StageStats or None
+        Stage statistics.
+    name : str
+        Name of the stage.
+    """
+    if stats is None:
+        return nullcontext()
+    return stats.stage(name)
@@ -0,0 +1,157 @@
+import os
+
+import numpy as np
+
+from .catalogue import GroupCatalogue, get_label_dtype
+from .tiled import load_positions
+
+
+def open_npy(dirname, name, shape, dtype):
+    """Creates a memory-mapped .npy file in dirname.
+
+    Parameters
+    ----------
+    dirname : str
+        Output directory.
+    name : str
+        Name of the file, without the .npy extension.
+    shape : tuple
+        Shape of the array.
+    dtype : dtype
+        Dtype of the array.
+
+    Returns
+    -------
+    array : memmap
+        Writable memory map of the file.
+    """
+    return np.lib.format.open_memmap(os.path.join(dirname, name + '.npy'), mode='w+', dtype=dtype, shape=shape)
+
+
+def write_catalogue(dirname, labels, x, y, z=None, boxsize=None, chunk_size=1000000):
+    """Writes a group catalogue straight to memory-mapped .npy files, reading the
+    labels and positions chunk by chunk so the catalogue is never held in memory.
+
+    The files written to dirname are:
+
+    - labels.npy : group label of each point, -1 for ungrouped points.
+    - members.npy, offsets.npy : members of group i are members[offsets[i]:offsets[i+1]].
+    - ungrouped.npy : index of the ungrouped points.
+    - x_cat.npy, y_cat.npy, z_cat.npy : group mean positions followed by the
+      positions of the ungrouped points, as returned by GroupFinder.get_catalogue.
+
+    Parameters
+    ----------
+    dirname : str
+        Output directory, created if it does not exist.
+    labels : int array or str
+        Group label of each point, or the file name of a .npy file of labels
+        (e.g. the output of find_groups_tiled). A labels file already at
+        dirname/labels.npy is used in place.
+    x, y, z : array_like or str
+        Positions or the file names of .npy files containing the positions.
+    boxsize : float or array_like, optional
+        Size of a periodic box, if given the group mean positions are wrapped
+        across the periodic boundaries.
+    chunk_size : int
+        Number of points read at a time.
+    """
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    pos = load_positions(x, y, z)
+    # labels already written to dirname/labels.npy are not copied onto themselves.
+    copy_labels = True
+    if isinstance(labels, str):
+        copy_labels = os.path.abspath(labels) != os.path.abspath(os.path.join(dirname, 'labels.npy'))
+        labels = np.load(labels, mmap_mode='r')
+    Npoint = len(labels)
+    dtype = get_label_dtype(Npoint)
+    # first pass: group sizes.
+    N_groups = 0
+    for i in range(0, Npoint, chunk_size):
+        N_groups = max(N_groups, int(np.max(labels[i:i+chunk_size], initial=-1)) + 1)
+    sizes = np.zeros(N_groups + 1, dtype='int')
+    for i in range(0, Npoint, chunk_size):
+        sizes += np.bincount(np.asarray(labels[i:i+chunk_size]) + 1, minlength=N_groups + 1)
+    N_out = int(sizes[0])
+    # second pass: counting sort of the points into members and ungrouped.
+    if copy_labels:
+        out_labels = open_npy(dirname, 'labels', (Npoint,), np.asarray(labels[:0]).dtype)
+    offsets = open_npy(dirname, 'offsets', (N_groups + 1,), dtype)
+    offsets[0] = 0
+    offsets[1:] = np.cumsum(sizes[1:])
+    members = open_npy(dirname, 'members', (int(offsets[-1]),), dtype)
+    ungrouped = open_npy(dirname, 'ungrouped', (N_out,), dtype)
+    fill = np.concatenate([[0], np.asarray(offsets[:-1])])
+    for i in range(0, Npoint, chunk_size):
+        _labels = np.asarray(labels[i:i+chunk_size])
+        if copy_labels:
+            out_labels[i:i+len(_labels)] = _labels
+        order = np.argsort(_labels, kind='stable')
+        counts = np.bincount(_labels + 1, minlength=N_groups + 1)
+        rank = np.arange(len(_labels)) - np.repeat(np.cumsum(counts) - counts, counts)
+        index = (i + order).astype(dtype)
+        condition = np.where(_labels[order] == -1)[0]
+        ungrouped[fill[0] + rank[condition]] = index[condition]
+        condition = np.where(_labels[order] != -1)[0]
+        members[fill[_labels[order][condition] + 1] + rank[condition]] = index[condition]
+        fill += counts
+    # third pass: group mean positions, in a periodic box separations are taken
+    # from the first member of each group.
+    if boxsize is not None:
+        boxsize = np.zeros(len(pos)) + boxsize
+        first = np.asarray(members[np.asarray(offsets[:-1])])
+        pos_ref = [np.asarray(pos[j])[first] if N_groups > 0 else np.zeros(0) for j in range(0, len(pos))]
+    pos_sum = np.zeros((len(pos), N_groups))
+    for i in range(0, Npoint, chunk_size):
+        _labels = np.asarray(labels[i:i+chunk_size])
+        condition = np.where(_labels != -1)[0]
+        for j in range(0, len(pos)):
+            _x = np.asarray(pos[j][i:i+chunk_size])[condition]
+            if boxsize is not None:
+                _x = np.mod(_x - pos_ref[j][_labels[condition]] + 0.5*boxsize[j], boxsize[j]) - 0.5*boxsize[j]
+            pos_sum[j] += np.bincount(_labels[condition], weights=_x, minlength=N_groups)
+    pos_mean = pos_sum/np.diff(np.asarray(offsets))
+    if boxsize is not None:
+        pos_mean = np.array([np.mod(pos_ref[j] + pos_mean[j], boxsize[j]) for j in range(0, len(pos))])
+    for j, name in enumerate(['x_cat', 'y_cat', 'z_cat'][:len(pos)]):
+        cat = open_npy(dirname, name, (N_groups + N_out,), 'float64')
+        cat[:N_groups] = pos_mean[j]
+        for i in range(0, N_out, chunk_size):
+            cat[N_groups+i:N_groups+i+chunk_size] = np.asarray(pos[j])[np.asarray(ungrouped[i:i+chunk_size])]
+        cat.flush()
+        del cat
+    for array in [offsets, members, ungrouped]:
+        array.flush()
+    if copy_labels:
+        out_labels.flush()
+
+
+def load_catalogue(dirname, mmap_mode='r'):
+    """Reopens a catalogue written by write_catalogue as memory maps, without
+    reading it into memory.
+
+    Parameters
+    ----------
+    dirname : str
+        Directory of the catalogue.
+    mmap_mode : str
+        Memory map mode passed to np.load.
+
+    Returns
+    -------
+    catalogue : dict
+        The 'labels' of each point, the 'groups' as a GroupCatalogue of memory
+        maps, the number of groups 'N_groups' and the catalogue positions 'x_cat',
+        'y_cat' and (in 3D) 'z_cat'. The first N_groups catalogue positions are the
+        group mean positions.
+    """
+    catalogue = {}
+    for name in ['labels', 'members', 'offsets', 'ungrouped', 'x_cat', 'y_cat', 'z_cat']:
+        fname = os.path.join(dirname, name + '.npy')
+        if os.path.exists(fname):
+            catalogue[name] = np.load(fname, mmap_mode=mmap_mode)
+    catalogue['groups'] = GroupCatalogue(members=catalogue.pop('members'), offsets=catalogue.pop('offsets'),
+                                         ungrouped=catalogue.pop('ungrouped'))
+    catalogue['N_groups'] = len(catalogue['groups'])
+    return catalogue
@@ -1,4 +1,9 @@
 import numpy as np
+from itertools import chain
+
+from .adjacency import friends2csr, csr2friends, get_component_labels, groups2labels, groups2members
+from .catalogue import GroupCatalogue, labels2catalogue
+from .reduction import get_label_stats
 
 
 def find_friends(Npoints, edge_index):
@@ -18,14 +23,36 @@ def find_friends(Npoints, edge_index):
     """
     # check Npoints is an integer
     assert isinstance(Npoints, int), 'Npoints must be an integer.'
-    # create a list of empty list with the same size as the number of points
-    friends = [[] for i in range(0, Npoints)]
-    # append friends for each point
-    for i in range(0, len(edge_index[0])):
-        friends[edge_index[0][i]].append(edge_index[1][i])
-        friends[edge_index[1][i]].append(edge_index[0][i])
+    indptr, indices = find_friends_csr(Npoints, edge_index)
+    friends = csr2friends(indptr, indices)
     return friends
 
+def find_friends_csr(Npoints, edge_index):
+    """Returns the 'friends' of each point in compressed sparse row (CSR) format.
+    The friends of each point are given in the order of the edges.
+
+    Parameters
+    ----------
+    Npoints : int
+        The Number of points in the Tree.
+    edge_index : array
+        A 2 dimensional array containing the edges of the tree.
+
+    Returns
+    -------
+    indptr, indices : int array
+        The friends of point i are indices[indptr[i]:indptr[i+1]].
+    """
+    edge_index = np.asarray(edge_index).astype('int')
+    # interleave both directions of each edge so a stable argsort keeps the edge order.
+    row = np.ravel(edge_index.T)
+    col = np.ravel(edge_index[::-1].T)
+    order = np.argsort(row, kind='stable')
+    indptr = np.zeros(Npoints + 1, dtype='int')
+    indptr[1:] = np.cumsum(np.bincount(row, minlength=Npoints))
+    indices = col[order]
+    return indptr, indices
+
 def friends2groups(friends):
     """Converts a list of friends for each point to a list of groups.
 
@@ -36,23 +63,12 @@ def friends2groups(friends):
 
     Returns
     -------
-    groups : list
-        A list of member points in each group.
+    groups : GroupCatalogue
+        The member points in each group.
     """
-    friend_count = [float(len(friends[i])) for i in range(0, len(friends))]
-    mask = np.zeros(len(friends))
-    groups = []
-    for i in range(0, len(friends)):
-        if mask[i] == 0. and friend_count[i] != 0.:
-            group = np.concatenate([np.array([i]), np.array(friends[i])])
-            subgroup = np.unique(np.hstack(np.array([friends[group[j]] for j in range(0, len(group))])))
-            newgroup = np.unique(np.concatenate([group, subgroup]))
-            while len(group) < len(newgroup):
-                group = newgroup
-                subgroup = np.unique(np.hstack(np.array([friends[group[j]] for j in range(0, len(group))])))
-                newgroup = np.unique(np.concatenate([group, subgroup]))
-            groups.append(newgroup)
-            mask[group] = 1.
+    indptr, indices = friends2csr(friends)
+    labels = get_component_labels(indptr, indices)
+    groups = labels2catalogue(labels)
     return groups
 
 def get_group_mean(groups, param, weights=None):
@@ -61,7 +77,8 @@ def get_group_mean(groups, param, weights=None):
     Parameters
     ----------
     groups : list
-        A list of member points in each group.
+        A list of member points in each group. Groups may overlap, a point in
+        several groups contributes to each of them.
     param : array
         Parameter value for each point in the tree.
     weights : array
@@ -72,10 +89,17 @@ def get_group_mean(groups, param, weights=None):
     group_param_mean : list
         Parameter mean for each group.
     """
+    # statistics are computed over the members of each group rather than a label
+    # per point, so points in several groups are counted in each.
+    members, member_labels = groups2members(groups)
     if weights is None:
-        group_param_mean = [np.mean(param[groups[i]]) for i in range(0, len(groups))]
+        group_param_mean = get_label_stats(member_labels, np.asarray(param)[members], stats=['mean'],
+                                           N_groups=len(groups))['mean']
     else:
-        group_param_mean = [np.sum(param[groups[i]]*weights[groups[i]])/np.sum(weights[groups[i]]) for i in range(0, len(groups))]
+        group_param_mean = get_label_stats(member_labels, np.asarray(param)[members],
+                                           weights=np.asarray(weights)[members], stats=['wmean'],
+                                           N_groups=len(groups))['wmean']
+    group_param_mean = list(group_param_mean)
     return group_param_mean
 
 def get_friends_in_groups(friends, groups):
@@ -93,12 +117,27 @@ def get_friends_in_groups(friends, groups):
     friends_in_group : list
         List the friends of each group member in every group.
     """
-    friends_in_groups = [[friends[groups[j][i]] for i in range(0, len(groups[j]))] for j in range(0, len(groups))]
-    friends_in_groups = [[np.array(friends_in_groups[j][i])[friends_in_groups[j][i] > groups[j][i]] for i in range(0, len(groups[j]))] for j in range(0, len(groups))]
+    indptr, indices = friends2csr(friends)
+    if isinstance(groups, GroupCatalogue):
+        members, sizes = groups.members, groups.get_sizes()
+    else:
+        sizes = np.array([len(groups[j]) for j in range(0, len(groups))], dtype='int')
+        members = np.concatenate([np.asarray(groups[j], dtype='int') for j in range(0, len(groups))] + [np.array([], dtype='int')])
+    # gather the friends of every member into one flat array.
+    counts = np.diff(indptr)[members]
+    member_id = np.repeat(np.arange(len(members)), counts)
+    within = np.arange(len(member_id)) - np.repeat(np.cumsum(counts) - counts, counts)
+    member_friends = indices[np.repeat(indptr[members], counts) + within]
+    condition = np.where(member_friends > members[member_id])[0]
+    counts = np.bincount(member_id[condition], minlength=len(members))
+    friends_in_members = np.split(member_friends[condition], np.cumsum(counts)[:-1]) if len(members) > 0 else []
+    friends_in_groups = [friends_in_members[start:end] for start, end in zip(np.cumsum(sizes) - sizes, np.cumsum(sizes))]
     return friends_in_groups
 
 def get_group_edges(groups, friends_in_groups):
-    """Returns the edges in each group
+    """Returns the edges in each group, built from the contiguous edge arrays of
+    get_group_edge_index. Building the nested lists dominates the cost for
+    large trees, get_group_edge_index returns the flat arrays directly.
 
     Parameters
     ----------
@@ -110,10 +149,64 @@ def get_group_edges(groups, friends_in_groups):
     Returns
     -------
     edge_end1 : list
-        The starting point of each edge in the groups.
+        The starting point of each edge in the groups, in increasing order.
     edge_end2 : list
         The end points of each edge in the groups.
     """
-    edge_end1 = [[groups[j][i] for i in range(0, len(groups[j])) if len(friends_in_groups[j][i]) > 0] for j in range(0, len(groups))]
-    edge_end2 = [[friends_in_groups[j][i].tolist() for i in range(0, len(groups[j])) if len(friends_in_groups[j][i]) > 0] for j in range(0, len(groups))]
+    if isinstance(groups, GroupCatalogue):
+        members = groups.members
+    else:
+        members = np.concatenate([np.asarray(groups[j], dtype='int') for j in range(0, len(groups))] + [np.array([], dtype='int')])
+    friend_arrays = list(chain.from_iterable(friends_in_groups))
+    counts = np.fromiter(map(len, friend_arrays), dtype='int', count=len(friend_arrays))
+    friends = np.concatenate(friend_arrays + [np.array([], dtype='int')]).astype('int')
+    edge_index = np.array([np.repeat(np.asarray(members, dtype='int'), counts), friends])
+    Npoints = int(max(np.max(members, initial=-1), np.max(friends, initial=-1))) + 1
+    end1, end2, offsets = get_group_edge_index(groups, edge_index, Npoints)
+    # edges from the same starting point are consecutive, each run of equal
+    # end1 within a group is one member.
+    run_start = np.where(np.diff(end1, prepend=-1) != 0)[0]
+    run_start = np.union1d(run_start, offsets[:-1][offsets[:-1] < len(end1)])
+    run_end = np.append(run_start[1:], len(end1))
+    group_runs = np.searchsorted(run_start, offsets)
+    end1_list = end1[run_start].tolist()
+    end2_list = end2.tolist()
+    end2_runs = list(map(end2_list.__getitem__, map(slice, run_start.tolist(), run_end.tolist())))
+    group_slices = list(map(slice, group_runs[:-1].tolist(), group_runs[1:].tolist()))
+    edge_end1 = list(map(end1_list.__getitem__, group_slices))
+    edge_end2 = list(map(end2_runs.__getitem__, group_slices))
     return edge_end1, edge_end2
+
+def get_group_edge_index(groups, edge_index, Npoints):
+    """Returns the edges in each group as contiguous arrays, found from a per-edge
+    group label derived from the group labels of the points on either end.
+
+    Parameters
+    ----------
+    groups : list or GroupCatalogue
+        A list of member points in each group.
+    edge_index : array
+        A 2 dimensional array containing the edges of the tree.
+    Npoints : int
+        The Number of points in the Tree.
+
+    Returns
+    -------
+    edge_end1 : int array
+        The starting point of each edge in the groups, the smaller index of the
+        two points.
+    edge_end2 : int array
+        The end point of each edge in the groups.
+    offsets : int array
+        The edges of group i are edge_end1[offsets[i]:offsets[i+1]].
+    """
+    edge_index = np.asarray(edge_index).astype('int')
+    labels = groups2labels(groups, Npoints)
+    edge_labels = labels[edge_index[0]]
+    condition = np.where((edge_labels != -1) & (edge_labels == labels[edge_index[1]]))[0]
+    edge_labels = edge_labels[condition]
+    edge_end1 = np.minimum(edge_index[0][condition], edge_index[1][condition])
+    edge_end2 = np.maximum(edge_index[0][condition], edge_index[1][condition])
+    order = np.lexsort((edge_end2, edge_end1, edge_labels))
+    offsets = np.searchsorted(edge_labels[order], np.arange(len(groups) + 1))
+    return edge_end1[order], edge_end2[order], offsets
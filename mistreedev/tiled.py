@@ -0,0 +1,446 @@
+import os
+import shutil
+import tempfile
+from itertools import product
+
+import numpy as np
+from sklearn.neighbors import KDTree
+
+from .adjacency import edges2csr, get_component_labels
+from .catalogue import get_label_dtype
+from .union_find import UnionFind
+
+
+def load_positions(x, y, z=None):
+    """Returns the coordinate arrays, opening .npy file names as read-only memory
+    maps so positions are only read from disk when they are needed.
+
+    Parameters
+    ----------
+    x, y, z : array_like or str
+        Positions or the file names of .npy files containing the positions.
+
+    Returns
+    -------
+    pos : list
+        List of the coordinate arrays.
+    """
+    pos = []
+    for _x in [x, y, z]:
+        if _x is None:
+            continue
+        if isinstance(_x, str):
+            _x = np.load(_x, mmap_mode='r')
+        pos.append(_x)
+    return pos
+
+
+def get_bounds(pos, chunk_size=1000000):
+    """Finds the minimum and maximum of each coordinate reading chunk by chunk.
+
+    Parameters
+    ----------
+    pos : list
+        List of the coordinate arrays.
+    chunk_size : int
+        Number of points read at a time.
+
+    Returns
+    -------
+    pos_min, pos_max : array
+        Minimum and maximum of each coordinate.
+    """
+    Npoint = len(pos[0])
+    pos_min = np.array([np.inf]*len(pos))
+    pos_max = np.array([-np.inf]*len(pos))
+    for i in range(0, Npoint, chunk_size):
+        for j in range(0, len(pos)):
+            _x = np.asarray(pos[j][i:i+chunk_size])
+            pos_min[j] = min(pos_min[j], _x.min())
+            pos_max[j] = max(pos_max[j], _x.max())
+    return pos_min, pos_max
+
+
+def get_tile_edges(pos_min, pos_max, ntiles):
+    """Splits the bounding box into a regular grid of tiles.
+
+    Parameters
+    ----------
+    pos_min, pos_max : array
+        Minimum and maximum of each coordinate.
+    ntiles : int or list
+        Number of tiles along each axis.
+
+    Returns
+    -------
+    tile_edges : list
+        The edges of the tiles along each axis.
+    """
+    ntiles = np.zeros(len(pos_min), dtype='int') + ntiles
+    tile_edges = [np.linspace(pos_min[j], pos_max[j], ntiles[j] + 1) for j in range(0, len(pos_min))]
+    return tile_edges
+
+
+def get_tile_index(pos, tile_edges):
+    """Returns the tile of each point along each axis, points on the upper edge of
+    the last tile belong to that tile.
+
+    Parameters
+    ----------
+    pos : array
+        Positions, with shape (number of points, number of dimensions).
+    tile_edges : list
+        The edges of the tiles along each axis.
+
+    Returns
+    -------
+    tile : int array
+        Tile index of each point along each axis.
+    """
+    tile = np.zeros(np.shape(pos), dtype='int')
+    for j in range(0, len(tile_edges)):
+        tile[:, j] = np.searchsorted(tile_edges[j], pos[:, j], side='right') - 1
+        tile[:, j] = np.clip(tile[:, j], 0, len(tile_edges[j]) - 2)
+    return tile
+
+
+def append_bucket(dirname, name, index, pos):
+    """Appends points to the index and position files of a tile bucket.
+
+    Parameters
+    ----------
+    dirname : str
+        Directory of the buckets.
+    name : str
+        Name of the bucket.
+    index : int array
+        Index of the points.
+    pos : array
+        Positions of the points.
+    """
+    with open(os.path.join(dirname, name + '.idx'), 'ab') as f:
+        np.asarray(index, dtype='int64').tofile(f)
+    with open(os.path.join(dirname, name + '.pos'), 'ab') as f:
+        np.asarray(pos, dtype='float64').tofile(f)
+
+
+def read_bucket(dirname, name, ndim):
+    """Reads the index and positions of the points in a tile bucket.
+
+    Parameters
+    ----------
+    dirname : str
+        Directory of the buckets.
+    name : str
+        Name of the bucket.
+    ndim : int
+        Number of dimensions.
+
+    Returns
+    -------
+    index : int array
+        Index of the points.
+    pos : array
+        Positions of the points.
+    """
+    fname = os.path.join(dirname, name + '.idx')
+    if not os.path.exists(fname):
+        return np.array([], dtype='int64'), np.zeros((0, ndim))
+    index = np.fromfile(fname, dtype='int64')
+    pos = np.fromfile(os.path.join(dirname, name + '.pos'), dtype='float64').reshape(-1, ndim)
+    return index, pos
+
+
+def partition_tiles(pos, tile_edges, linking_length, dirname, chunk_size=1000000):
+    """Sorts the points into per-tile buckets of core points (inside the tile) and
+    halo points (within one linking length of the tile) in a single pass over
+    the positions. The buckets are written to files in dirname.
+
+    Parameters
+    ----------
+    pos : list
+        List of the coordinate arrays.
+    tile_edges : list
+        The edges of the tiles along each axis.
+    linking_length : float
+        Linking length distance.
+    dirname : str
+        Directory the buckets are written to.
+    chunk_size : int
+        Number of points read at a time.
+    """
+    ndim = len(pos)
+    Ntiles = [len(tile_edges[j]) - 1 for j in range(0, ndim)]
+    # halos reach across more than the adjacent tile if tiles are narrower than
+    # the linking length.
+    reach = []
+    for j in range(0, ndim):
+        width = np.min(np.diff(tile_edges[j]))
+        if width <= 0.:
+            reach.append(Ntiles[j] - 1)
+        else:
+            reach.append(min(int(np.ceil(linking_length/width)), Ntiles[j] - 1))
+    offsets = [offset for offset in product(*[range(-reach[j], reach[j] + 1) for j in range(0, ndim)])
+               if any(offset)]
+    Npoint = len(pos[0])
+    for i in range(0, Npoint, chunk_size):
+        _pos = np.array([np.asarray(pos[j][i:i+chunk_size]) for j in range(0, ndim)]).T
+        _index = np.arange(i, i + len(_pos))
+        core_tile = get_tile_index(_pos, tile_edges)
+        buckets = [(np.ravel_multi_index(tuple(core_tile.T), Ntiles), 'core', np.arange(len(_pos)))]
+        for offset in offsets:
+            tile = core_tile + np.array(offset)
+            valid = np.all((tile >= 0) & (tile < Ntiles), axis=1)
+            for j in range(0, ndim):
+                if offset[j] != 0:
+                    _tile = np.clip(tile[:, j], 0, Ntiles[j] - 1)
+                    valid &= (_pos[:, j] >= tile_edges[j][_tile] - linking_length)
+                    valid &= (_pos[:, j] <= tile_edges[j][_tile + 1] + linking_length)
+            which = np.where(valid)[0]
+            buckets.append((np.ravel_multi_index(tuple(tile[which].T), Ntiles), 'halo', which))
+        for tile_id, kind, which in buckets:
+            order = np.argsort(tile_id, kind='stable')
+            unique_tiles, first = np.unique(tile_id[order], return_index=True)
+            for tile_id, members in zip(unique_tiles, np.split(which[order], first[1:])):
+                append_bucket(dirname, 'tile_%i_%s' % (tile_id, kind), _index[members], _pos[members])
+
+
+def get_tile_labels(core_pos, halo_pos, linking_length, leaf_size=10):
+    """Runs friends-of-friends on the points of a tile and its halo, only pairs
+    with at least one point inside the tile are used.
+
+    Parameters
+    ----------
+    core_pos, halo_pos : array
+        Positions of the core and halo points.
+    linking_length : float
+        Linking length distance.
+    leaf_size : int
+        KDTree leaf size.
+
+    Returns
+    -------
+    labels : int array
+        Local group label of the core points followed by the halo points, -1
+        means the point is not a member of any group.
+    """
+    Ncore = len(core_pos)
+    pos = np.concatenate([core_pos, halo_pos])
+    if Ncore == 0:
+        return np.zeros(len(pos), dtype='int') - 1
+    tree_data = KDTree(pos, leaf_size=leaf_size)
+    friends = tree_data.query_radius(core_pos, r=linking_length)
+    counts = np.array([len(friends[i]) for i in range(0, Ncore)], dtype='int')
+    index1 = np.repeat(np.arange(Ncore), counts)
+    index2 = np.concatenate(friends).astype('int')
+    condition = np.where(index1 != index2)[0]
+    indptr, indices = edges2csr(len(pos), index1[condition], index2[condition])
+    labels = get_component_labels(indptr, indices, dtype='int64')
+    return labels
+
+
+def set_tile_labels(labels, core_index, halo_index, tile_labels, N_boundary):
+    """Writes the labels of the core points of a tile. Groups with no halo member
+    are complete and every member is labelled with the index of the group's
+    first member. Groups with a halo member may continue in other tiles, their
+    members are given the code -2 - boundary group number until they are
+    stitched together.
+
+    Parameters
+    ----------
+    labels : int array
+        Label of each point, the core points are overwritten.
+    core_index, halo_index : int array
+        Index of the core and halo points, in increasing order.
+    tile_labels : int array
+        Local group label of the core points followed by the halo points.
+    N_boundary : int
+        Number of boundary groups in previous tiles.
+
+    Returns
+    -------
+    boundary_key : int array
+        Index of the first core member of each new boundary group.
+    link_group : int array
+        Boundary group of each grouped halo point.
+    link_index : int array
+        Index of each grouped halo point.
+    """
+    Ncore = len(core_index)
+    core_labels = tile_labels[:Ncore]
+    halo_labels = tile_labels[Ncore:]
+    N_local = int(tile_labels.max(initial=-1)) + 1
+    first = np.zeros(N_local, dtype='int64') + np.iinfo('int64').max
+    condition = np.where(core_labels != -1)[0]
+    np.minimum.at(first, core_labels[condition], core_index[condition])
+    is_boundary = np.zeros(N_local, dtype='bool')
+    is_boundary[halo_labels[halo_labels != -1]] = True
+    boundary_id = np.zeros(N_local, dtype='int64') - 1
+    boundary_id[is_boundary] = N_boundary + np.arange(np.count_nonzero(is_boundary))
+    local_value = np.where(is_boundary, -2 - boundary_id, first)
+    values = np.zeros(Ncore, dtype='int64') - 1
+    values[condition] = local_value[core_labels[condition]]
+    labels[core_index] = values
+    condition = np.where(halo_labels != -1)[0]
+    return first[is_boundary], boundary_id[halo_labels[condition]], halo_index[condition]
+
+
+def find_groups_tiled(linking_length, x, y, z=None, ntiles=4, chunk_size=1000000, labels=None, tmpdir=None):
+    """Friends-of-friends group finding for point sets larger than memory.
+
+    The domain is split into a grid of tiles. A single chunked pass over the
+    positions sorts the points of each tile and of a halo of one linking length
+    around it into bucket files, then groups are found one tile at a time from
+    its bucket. Groups which do not reach the halo are labelled directly, only
+    groups which cross tile boundaries are stitched together with a union-find.
+    Apart from the labels, memory is set by the tile size and the number of
+    boundary groups. Assigning the final compact labels adds a bitmap of the
+    first member of each group (N/8 bytes) and the number of first members
+    before each 64 bit word of the bitmap (another N/8 bytes as int64).
+
+    Parameters
+    ----------
+    linking_length : float
+        Linking length distance.
+    x, y, z : array_like or str
+        Positions given in 2D or 3D (=> z is optional), either arrays, memory maps
+        or the file names of .npy files.
+    ntiles : int or list
+        Number of tiles along each axis.
+    chunk_size : int
+        Number of points read at a time.
+    labels : int array or str, optional
+        Output array for the labels, for example a memory-mapped .npy file opened
+        with np.lib.format.open_memmap, of length equal to the number of points,
+        or the file name of a .npy file to create. By default the labels are held
+        in memory.
+    tmpdir : str, optional
+        Directory in which the temporary tile buckets are written.
+
+    Returns
+    -------
+    labels : int array
+        Group label of each point, -1 means the point is not a member of any
+        group. Groups are ordered by their first member, i.e. in the same order
+        as get_groups.
+    """
+    pos = load_positions(x, y, z)
+    Npoint = len(pos[0])
+    dtype = get_label_dtype(Npoint)
+    if labels is None:
+        labels = np.zeros(Npoint, dtype=dtype)
+    elif isinstance(labels, str):
+        labels = np.lib.format.open_memmap(labels, mode='w+', dtype=dtype, shape=(Npoint,))
+    assert len(labels) == Npoint, 'labels must have the same length as the positions.'
+    if Npoint == 0:
+        return labels
+    pos_min, pos_max = get_bounds(pos, chunk_size=chunk_size)
+    tile_edges = get_tile_edges(pos_min, pos_max, ntiles)
+    Ntiles = [len(tile_edges[j]) - 1 for j in range(0, len(pos))]
+    dirname = tempfile.mkdtemp(dir=tmpdir)
+    try:
+        partition_tiles(pos, tile_edges, linking_length, dirname, chunk_size=chunk_size)
+        N_boundary = 0
+        boundary_key, link_group, link_index = [], [], []
+        for tile_id in range(0, int(np.prod(Ntiles))):
+            core_index, core_pos = read_bucket(dirname, 'tile_%i_core' % tile_id, len(pos))
+            if len(core_index) == 0:
+                continue
+            halo_index, halo_pos = read_bucket(dirname, 'tile_%i_halo' % tile_id, len(pos))
+            tile_labels = get_tile_labels(core_pos, halo_pos, linking_length)
+            _boundary_key, _link_group, _link_index = set_tile_labels(labels, core_index, halo_index,
+                                                                      tile_labels, N_boundary)
+            N_boundary += len(_boundary_key)
+            boundary_key.append(_boundary_key)
+            link_group.append(_link_group)
+            link_index.append(_link_index)
+    finally:
+        shutil.rmtree(dirname)
+    labels = stitch_tile_labels(labels, boundary_key, link_group, link_index, chunk_size=chunk_size)
+    return labels
+
+
+def get_popcount(words):
+    """Returns the number of set bits in each 64 bit word.
+
+    Parameters
+    ----------
+    words : uint64 array
+        Words.
+
+    Returns
+    -------
+    counts : int array
+        Number of set bits in each word.
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).astype('int64')
+    bits = np.unpackbits(np.ascontiguousarray(words).view('uint8'))
+    return bits.reshape(-1, 64).sum(axis=1).astype('int64')
+
+
+def stitch_tile_labels(labels, boundary_key, link_group, link_index, chunk_size=1000000):
+    """Stitches together groups which cross tile boundaries and assigns the final
+    compact group labels.
+
+    Parameters
+    ----------
+    labels : int array
+        Label of each point written by set_tile_labels, the index of the first
+        member of complete groups, -2 - boundary group number for groups which
+        cross tiles and -1 for points which are not a member of any group. This
+        is overwritten.
+    boundary_key : list
+        Index of the first member of each boundary group within its tile.
+    link_group : list
+        Boundary group of each grouped halo point.
+    link_index : list
+        Index of each grouped halo point.
+    chunk_size : int
+        Number of labels processed at a time.
+
+    Returns
+    -------
+    labels : int array
+        Group label of each point, -1 means the point is not a member of any
+        group. Groups are ordered by their first member.
+    """
+    boundary_key = np.concatenate([np.array([], dtype='int64')] + boundary_key)
+    link_group = np.concatenate([np.array([], dtype='int64')] + link_group)
+    link_index = np.concatenate([np.array([], dtype='int64')] + link_index)
+    # a halo point always belongs to a boundary group of the tile it is a core
+    # point of, the groups on either side of each link are merged.
+    order = np.argsort(link_index)
+    link_other = np.zeros(len(link_index), dtype='int64')
+    link_other[order] = -2 - np.asarray(labels[link_index[order]]).astype('int64')
+    uf = UnionFind(len(boundary_key))
+    uf.union_edges(link_group, link_other)
+    roots = uf.get_roots()
+    root_key = np.zeros(len(boundary_key), dtype='int64') + np.iinfo('int64').max
+    np.minimum.at(root_key, roots, boundary_key)
+    group_key = root_key[roots]
+    # every grouped point now gets the index of its group's first member, and a
+    # bitmap marks the first members.
+    Npoint = len(labels)
+    chunk_size = max(64*(chunk_size//64), 64)
+    bitmap = np.zeros(8*(-(-Npoint//64)), dtype='uint8')
+    for i in range(0, Npoint, chunk_size):
+        _labels = np.asarray(labels[i:i+chunk_size]).astype('int64')
+        condition = np.where(_labels <= -2)[0]
+        _labels[condition] = group_key[-2 - _labels[condition]]
+        labels[i:i+chunk_size] = _labels
+        is_first = _labels == np.arange(i, i + len(_labels))
+        packed = np.packbits(is_first, bitorder='little')
+        bitmap[i//8:i//8 + len(packed)] = packed
+    # the final label is the number of first members before the group's first member.
+    words = bitmap.view('<u8')
+    word_start = np.zeros(len(words), dtype='int64')
+    word_start[1:] = np.cumsum(get_popcount(words))[:-1]
+    for i in range(0, Npoint, chunk_size):
+        _labels = np.asarray(labels[i:i+chunk_size]).astype('int64')
+        condition = np.where(_labels != -1)[0]
+        first = _labels[condition]
+        mask = np.left_shift(np.uint64(1), (first % 64).astype('uint64')) - np.uint64(1)
+        _labels[condition] = word_start[first//64] + get_popcount(words[first//64] & mask)
+        labels[i:i+chunk_size] = _labels
+    return labels
@@ -1,7 +1,6 @@
 # The functions described here are being tested and should not be used for now.
 
 import numpy as np
-from mistree.mst import get_graph_degree
 
 
 def find_edge4point(index, edge_index):
@@ -20,9 +19,9 @@ def find_edge4point(index, edge_index):
         Returns a boolean array where edges that are attached to a node are True.
     """
     _same_index = np.intersect1d(index, edge_index[0])
-    edge_bool_1 = np.in1d(edge_index[0], _same_index)
+    edge_bool_1 = np.isin(edge_index[0], _same_index)
     _same_index = np.intersect1d(index, edge_index[1])
-    edge_bool_2 = np.in1d(edge_index[1], _same_index)
+    edge_bool_2 = np.isin(edge_index[1], _same_index)
     edge_bool = edge_bool_1 + edge_bool_2
     return edge_bool
 
@@ -51,11 +50,58 @@ def remove_tree_tips(degree, edge_index):
     tree_tip = np.where(degree == 1.)[0]
     edge_bool = find_edge4point(tree_tip, edge_index)
     edge_index_new = np.array([edge_index[0][np.invert(edge_bool)], edge_index[1][np.invert(edge_bool)]])
+    from mistree.mst import get_graph_degree
     degree_new = get_graph_degree(edge_index_new, number_of_nodes)
     return degree_new, edge_index_new, edge_bool
 
 
-def trim_tree(degree, edge_index, edge_length):
+def get_trim_rounds(degree, edge_index):
+    """Peels the tips of a tree (i.e. edges attached to nodes with d=1) layer by
+    layer and returns the round in which each edge is removed. Degrees are
+    decremented in place so each edge is processed exactly once.
+
+    Parameters
+    ----------
+    degree : array_like
+        The degree for each node of a tree.
+    edge_index : array_like
+        Array of the indexes of the nodes at either end of an edge.
+
+    Returns
+    -------
+    trim_round : int array
+        The round (starting from 1) in which each edge is removed, 0 means the
+        edge is never removed, i.e. it is part of a cycle.
+    """
+    number_of_nodes = len(degree)
+    edge_index = np.asarray(edge_index).astype('int')
+    number_of_edges = len(edge_index[0])
+    _degree = np.rint(degree).astype('int')
+    # CSR list of the edges attached to each node.
+    node = np.concatenate([edge_index[0], edge_index[1]])
+    order = np.argsort(node, kind='stable')
+    node_edges = np.concatenate([np.arange(number_of_edges), np.arange(number_of_edges)])[order]
+    indptr = np.zeros(number_of_nodes + 1, dtype='int')
+    indptr[1:] = np.cumsum(np.bincount(node, minlength=number_of_nodes))
+    trim_round = np.zeros(number_of_edges, dtype='int')
+    tree_tip = np.where(_degree == 1)[0]
+    current_round = 0
+    while len(tree_tip) > 0:
+        current_round += 1
+        # the edges attached to the current tips which have not yet been removed.
+        counts = indptr[tree_tip + 1] - indptr[tree_tip]
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        tip_edges = node_edges[np.repeat(indptr[tree_tip], counts) + within]
+        tip_edges = np.unique(tip_edges[trim_round[tip_edges] == 0])
+        trim_round[tip_edges] = current_round
+        ends = np.concatenate([edge_index[0][tip_edges], edge_index[1][tip_edges]])
+        np.subtract.at(_degree, ends, 1)
+        ends = np.unique(ends)
+        tree_tip = ends[_degree[ends] == 1]
+    return trim_round
+
+
+def trim_tree(degree, edge_index, edge_length, return_trim_label=False):
     """Successively trims the tips of a tree (i.e. edges with d=1) until every
     edge has been 'trimmed'.
 
@@ -67,6 +113,8 @@ def trim_tree(degree, edge_index, edge_length):
         Array of the indexes of the nodes at either end of an edge.
     edge_length : array_like
         Array of the lengths of each edge.
+    return_trim_label : bool
+        If True the trimming step of each edge is also returned.
 
     Returns
     -------
@@ -78,38 +126,110 @@ def trim_tree(degree, edge_index, edge_length):
         Cumulative length of edges removed.
     num_edges_removed : array
         Number of edges removed at each trimming step.
+    trim_label : int array
+        Only returned if return_trim_label is True, the trimming step in which
+        each edge is removed.
     """
-    _degree_temp = np.copy(degree)
-    _edge_index = np.copy(edge_index)
-    _edge_length = np.copy(edge_length)
-    num_edges_removed = []
-    edge_length_cumulative = []
-    edge_length_trim = []
-    total = 0.
-    edge_length_trim.append(0.)
-    edge_length_cumulative.append(0.)
-    num_edges_removed.append(0.)
-    while np.sum(_degree_temp) > 2. and len(_edge_index[0]) > 2.:
-        _degree_temp, _edge_index, edge_bool = remove_tree_tips(_degree_temp, _edge_index)
-        index_tips = np.where(edge_bool == True)[0]
-        edge_length_trim.append(_edge_length[index_tips])
-        total += np.sum(_edge_length[index_tips])
-        edge_length_trim.append(np.sum(_edge_length[index_tips]))
-        edge_length_cumulative.append(total)
-        num_edges_removed.append(float(len(index_tips)))
-        _edge_length = _edge_length[np.invert(edge_bool)]
-    if np.sum(_degree_temp) == 2.:
-        total += _edge_length
-        edge_length_trim.append(_edge_length)
-        edge_length_cumulative.append(total)
-        num_edges_removed.append(1.)
+    edge_length = np.asarray(edge_length)
+    trim_round = get_trim_rounds(degree, edge_index)
+    number_of_edges = len(edge_length)
+    # trimming stops once two or fewer edges remain, the remaining edges are
+    # removed together in the final step.
+    num_round = np.bincount(trim_round, minlength=trim_round.max(initial=0) + 1)[1:]
+    remaining = number_of_edges - np.concatenate([[0], np.cumsum(num_round)])
+    last_round = np.where(remaining <= 2)[0]
+    if len(last_round) > 0:
+        last_round = last_round[0]
     else:
-        total += np.sum(_edge_length)
-        edge_length_trim.append(np.sum(_edge_length))
-        edge_length_cumulative.append(total)
-        num_edges_removed.append(2.)
-    edge_length_trim = np.array(edge_length_trim)
-    edge_length_cumulative = np.array(edge_length_cumulative)
-    num_edges_removed = np.array(num_edges_removed)
+        # only possible when the remaining edges form a cycle.
+        last_round = len(num_round)
+    trim_label = np.copy(trim_round)
+    trim_label[(trim_round == 0) | (trim_round > last_round)] = last_round + 1
+    edge_length_trim = np.zeros(last_round + 2)
+    edge_length_trim[1:] = np.bincount(trim_label, weights=edge_length, minlength=last_round + 2)[1:]
+    num_edges_removed = np.zeros(last_round + 2)
+    num_edges_removed[1:-1] = num_round[:last_round]
+    if remaining[last_round] == 1:
+        num_edges_removed[-1] = 1.
+    else:
+        num_edges_removed[-1] = 2.
+    edge_length_cumulative = np.cumsum(edge_length_trim)
     trim_steps = np.arange(len(edge_length_cumulative))
+    if return_trim_label:
+        return trim_steps, edge_length_trim, edge_length_cumulative, num_edges_removed, trim_label
     return trim_steps, edge_length_trim, edge_length_cumulative, num_edges_removed
+
+
+def trim_forest(degree, edge_index, edge_length, edge_component, return_trim_label=False):
+    """Trims every tree in a forest of disconnected trees at once, returning the
+    trimming curves of each tree in a ragged (values + offsets) layout. The output
+    for each tree is the same as calling trim_tree on that tree alone.
+
+    Parameters
+    ----------
+    degree : array_like
+        The degree for each node of the forest.
+    edge_index : array_like
+        Array of the indexes of the nodes at either end of an edge.
+    edge_length : array_like
+        Array of the lengths of each edge.
+    edge_component : int array
+        The tree (component) label of each edge.
+    return_trim_label : bool
+        If True the trimming step of each edge is also returned.
+
+    Returns
+    -------
+    trim_steps : int array
+        The steps in the trimming process of each tree, the values for tree i are
+        trim_steps[offsets[i]:offsets[i+1]].
+    edge_length_trim : array
+        The sum of the lengths of edges being removed at each trimming step.
+    edge_length_cumulative : array
+        Cumulative length of edges removed.
+    num_edges_removed : array
+        Number of edges removed at each trimming step.
+    offsets : int array
+        Start of the values of each tree, with a final entry equal to the length
+        of the values.
+    components : array
+        The component label of each tree, in the order of the offsets.
+    trim_label : int array
+        Only returned if return_trim_label is True, the trimming step in which
+        each edge is removed, within its own tree.
+    """
+    edge_length = np.asarray(edge_length)
+    trim_round = get_trim_rounds(degree, edge_index)
+    components, edge_component = np.unique(edge_component, return_inverse=True)
+    number_of_components = len(components)
+    number_of_edges = np.bincount(edge_component, minlength=number_of_components)
+    # number of edges removed in each (component, round), sorted by component then round.
+    key = edge_component*(trim_round.max(initial=0) + 1) + trim_round
+    unique_key, key_index, key_counts = np.unique(key, return_inverse=True, return_counts=True)
+    key_component = unique_key // (trim_round.max(initial=0) + 1)
+    key_round = unique_key % (trim_round.max(initial=0) + 1)
+    # number of edges remaining before each round, edges never removed (round 0)
+    # are excluded from the cumulative count.
+    key_counts_removed = np.where(key_round > 0, key_counts, 0)
+    removed_before = np.cumsum(key_counts_removed) - key_counts_removed
+    component_start = np.searchsorted(key_component, np.arange(number_of_components))
+    removed_before -= removed_before[component_start][key_component]
+    remaining_before = number_of_edges[key_component] - removed_before
+    # trimming of each tree stops once two or fewer edges remain.
+    is_round = (key_round > 0) & (remaining_before > 2)
+    last_round = np.bincount(key_component[is_round], minlength=number_of_components)
+    offsets = np.zeros(number_of_components + 1, dtype='int')
+    offsets[1:] = np.cumsum(last_round + 2)
+    trim_label = np.where(is_round[key_index], trim_round, last_round[edge_component] + 1)
+    edge_step = offsets[edge_component] + trim_label
+    edge_length_trim = np.bincount(edge_step, weights=edge_length, minlength=offsets[-1])
+    num_edges_removed = np.bincount(edge_step, minlength=offsets[-1]).astype('float')
+    # the final step follows the convention of trim_tree.
+    final_step = offsets[1:] - 1
+    num_edges_removed[final_step] = np.where(num_edges_removed[final_step] == 1., 1., 2.)
+    edge_length_cumulative = np.cumsum(edge_length_trim)
+    edge_length_cumulative -= np.repeat(edge_length_cumulative[offsets[:-1]], last_round + 2)
+    trim_steps = np.arange(offsets[-1]) - np.repeat(offsets[:-1], last_round + 2)
+    if return_trim_label:
+        return trim_steps, edge_length_trim, edge_length_cumulative, num_edges_removed, offsets, components, trim_label
+    return trim_steps, edge_length_trim, edge_length_cumulative, num_edges_removed, offsets, components
@@ -0,0 +1,330 @@
+import numpy as np
+
+
+class UnionFind:
+
+    """Disjoint-set (union-find) structure with path compression and union by size."""
+
+    def __init__(self, Npoint):
+        """Initialises the class with every point in its own set.
+
+        Parameters
+        ----------
+        Npoint : int
+            Number of points.
+        """
+        self.Npoint = Npoint
+        self.parent = np.arange(Npoint)
+        self.size = np.ones(Npoint, dtype='int')
+
+    def add_points(self, Nnew):
+        """Adds new points, each in its own set.
+
+        Parameters
+        ----------
+        Nnew : int
+            Number of new points.
+        """
+        self.parent = np.concatenate([self.parent, np.arange(self.Npoint, self.Npoint + Nnew)])
+        self.size = np.concatenate([self.size, np.ones(Nnew, dtype='int')])
+        self.Npoint += Nnew
+
+    def find(self, i):
+        """Returns the root of the set containing point i.
+
+        Parameters
+        ----------
+        i : int
+            Index of the point.
+
+        Returns
+        -------
+        root : int
+            Index of the root point of the set.
+        """
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        # path compression.
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return int(root)
+
+    def union(self, i, j):
+        """Merges the sets containing points i and j.
+
+        Parameters
+        ----------
+        i, j : int
+            Index of the points.
+
+        Returns
+        -------
+        root : int
+            Index of the root of the merged set, or -1 if i and j were already
+            members of the same set.
+        """
+        root_i = self.find(i)
+        root_j = self.find(j)
+        if root_i == root_j:
+            return -1
+        if self.size[root_i] < self.size[root_j]:
+            root_i, root_j = root_j, root_i
+        self.parent[root_j] = root_i
+        self.size[root_i] += self.size[root_j]
+        return root_i
+
+    def union_edges(self, index1, index2):
+        """Merges the sets on either end of each edge, in the order given.
+
+        Parameters
+        ----------
+        index1, index2 : array
+            Index of the points at either end of each edge.
+
+        Returns
+        -------
+        merged : bool array
+            True where the edge joined two previously separate sets.
+        """
+        if 64*len(index1) < self.Npoint:
+            # for a few edges the arrays are updated in place, so the cost does not
+            # depend on the number of points.
+            merged = [self.union(i, j) != -1 for i, j in zip(np.asarray(index1).tolist(), np.asarray(index2).tolist())]
+            return np.array(merged, dtype='bool')
+        # the loop is run on python lists as scalar access is considerably faster
+        # than on numpy arrays.
+        parent = self.parent.tolist()
+        size = self.size.tolist()
+        merged = np.zeros(len(index1), dtype='bool')
+        for k, (i, j) in enumerate(zip(np.asarray(index1).tolist(), np.asarray(index2).tolist())):
+            root_i = i
+            while parent[root_i] != root_i:
+                root_i = parent[root_i]
+            while parent[i] != root_i:
+                parent[i], i = root_i, parent[i]
+            root_j = j
+            while parent[root_j] != root_j:
+                root_j = parent[root_j]
+            while parent[j] != root_j:
+                parent[j], j = root_j, parent[j]
+            if root_i == root_j:
+                continue
+            if size[root_i] < size[root_j]:
+                root_i, root_j = root_j, root_i
+            parent[root_j] = root_i
+            size[root_i] += size[root_j]
+            merged[k] = True
+        self.parent = np.array(parent, dtype='int')
+        self.size = np.array(size, dtype='int')
+        return merged
+
+    def get_roots(self, index=None):
+        """Returns the root of every point, fully compressing the paths.
+
+        Parameters
+        ----------
+        index : array, optional
+            Only return the roots for these points, in which case only their
+            paths are followed and the paths are not compressed.
+
+        Returns
+        -------
+        roots : array
+            Root of each point.
+        """
+        if index is not None:
+            roots = self.parent[index]
+            grandparent = self.parent[roots]
+            while np.any(grandparent != roots):
+                roots = grandparent
+                grandparent = self.parent[roots]
+            return roots
+        parent = self.parent
+        # pointer jumping, each pass halves the depth of the trees.
+        grandparent = parent[parent]
+        while np.any(grandparent != parent):
+            parent = grandparent
+            grandparent = parent[parent]
+        self.parent = parent
+        return np.copy(parent)
+
+
+def get_compact_labels(roots, key):
+    """Assigns compact labels 0, 1, ..., N_groups-1 to the sets found by a union-find,
+    ordered by an ordering key for each root.
+
+    Parameters
+    ----------
+    roots : array
+        Root of each member, -1 means the member is not part of any group.
+    key : array
+        The ordering key for each root, groups with a smaller key are given
+        smaller labels.
+
+    Returns
+    -------
+    labels : int array
+        Compact label for each member, -1 means the member is not part of any group.
+    """
+    roots = np.asarray(roots)
+    condition = np.where(roots != -1)[0]
+    unique_roots = np.unique(roots[condition])
+    order = np.argsort(key[unique_roots], kind='stable')
+    root_label = np.zeros(len(key), dtype='int') - 1
+    root_label[unique_roots[order]] = np.arange(len(unique_roots))
+    labels = np.zeros(len(roots), dtype='int') - 1
+    labels[condition] = root_label[roots[condition]]
+    return labels
+
+
+def get_merge_tree(Npoint, index1, index2):
+    """Builds the single-linkage merge tree (dendrogram) from a set of edges.
+
+    Points are the leaf nodes 0, ..., Npoint-1 and the k-th edge creates the
+    node Npoint+k when it merges two separate sets. Edges should be given in
+    the order they are merged, i.e. sorted by length.
+
+    Parameters
+    ----------
+    Npoint : int
+        Number of points.
+    index1, index2 : array
+        Index of the points at either end of each edge.
+
+    Returns
+    -------
+    merge_parent : int array
+        The node each node is merged into, -1 means the node is never merged.
+    merge_first : int array
+        The first edge in the subtree below each node, leaf nodes and edges
+        which do not merge two sets are given the number of edges.
+    """
+    Nedge = len(index1)
+    parent = list(range(Npoint))
+    size = [1]*Npoint
+    cluster_node = list(range(Npoint))
+    merge_parent = [-1]*(Npoint + Nedge)
+    merge_first = [Nedge]*(Npoint + Nedge)
+    for k, (i, j) in enumerate(zip(np.asarray(index1).tolist(), np.asarray(index2).tolist())):
+        root_i = i
+        while parent[root_i] != root_i:
+            root_i = parent[root_i]
+        while parent[i] != root_i:
+            parent[i], i = root_i, parent[i]
+        root_j = j
+        while parent[root_j] != root_j:
+            root_j = parent[root_j]
+        while parent[j] != root_j:
+            parent[j], j = root_j, parent[j]
+        if root_i == root_j:
+            continue
+        node_i = cluster_node[root_i]
+        node_j = cluster_node[root_j]
+        merge_parent[node_i] = Npoint + k
+        merge_parent[node_j] = Npoint + k
+        merge_first[Npoint + k] = min(merge_first[node_i], merge_first[node_j], k)
+        if size[root_i] < size[root_j]:
+            root_i, root_j = root_j, root_i
+        parent[root_j] = root_i
+        size[root_i] += size[root_j]
+        cluster_node[root_i] = Npoint + k
+    return np.array(merge_parent, dtype='int'), np.array(merge_first, dtype='int')
+
+
+def cut_merge_tree(merge_parent, Npoint, Nmerge):
+    """Cuts a merge tree after the first Nmerge edges, returning the top node
+    each point belongs to.
+
+    Parameters
+    ----------
+    merge_parent : int array
+        The node each node is merged into, -1 means the node is never merged.
+    Npoint : int
+        Number of points.
+    Nmerge : int
+        Number of edges (in merge order) kept.
+
+    Returns
+    -------
+    top : int array
+        The top node of each point, a point whose top node is itself is not
+        merged with any other point.
+    """
+    top = np.arange(len(merge_parent))
+    condition = np.where((merge_parent != -1) & (merge_parent < Npoint + Nmerge))[0]
+    top[condition] = merge_parent[condition]
+    # pointer jumping, parents always have larger node numbers than their children.
+    jump = top[top]
+    while np.any(jump != top):
+        top = jump
+        jump = top[top]
+    return top[:Npoint]
+
+
+def get_merge_order(merge_parent, Npoint):
+    """Orders the nodes of a merge tree depth first, so that the points and the
+    merge nodes below any node are contiguous in the ordering.
+
+    Parameters
+    ----------
+    merge_parent : int array
+        The node each node is merged into, -1 means the node is never merged.
+    Npoint : int
+        Number of points.
+
+    Returns
+    -------
+    point_order : int array
+        Points in depth first order, the points below node i are
+        point_order[point_start[i]:point_start[i]+point_count[i]].
+    point_start, point_count : int array
+        Start and number of the points below each node.
+    node_order : int array
+        Merge nodes in depth first order, given as the edge that created them,
+        the merge nodes below node i (including itself) are
+        node_order[node_start[i]:node_start[i]+node_count[i]].
+    node_start, node_count : int array
+        Start and number of the merge nodes below each node.
+    """
+    merge_parent = np.asarray(merge_parent)
+    Nnode = len(merge_parent)
+    parent = merge_parent.tolist()
+    point_count = [1]*Npoint + [0]*(Nnode - Npoint)
+    # parents always have larger node numbers than their children.
+    for i in range(0, Nnode):
+        if parent[i] != -1:
+            point_count[parent[i]] += point_count[i]
+    point_count = np.array(point_count, dtype='int')
+    # a merge tree is binary, so a merge node has one fewer merge nodes below
+    # it (including itself) than points.
+    node_count = np.zeros(Nnode, dtype='int')
+    node_count[Npoint:] = np.maximum(point_count[Npoint:] - 1, 1)
+    # the second child of each merge node is placed after the first, and the
+    # merge nodes below a merge node come after it.
+    child = np.where(merge_parent != -1)[0]
+    child = child[np.argsort(merge_parent[child], kind='stable')]
+    point_offset = np.zeros(Nnode, dtype='int')
+    node_offset = np.zeros(Nnode, dtype='int')
+    point_offset[child[1::2]] = point_count[child[::2]]
+    node_offset[child] = 1
+    node_offset[child[1::2]] += node_count[child[::2]]
+    roots = np.where(merge_parent == -1)[0][::-1]
+    point_offset[roots] = np.cumsum(point_count[roots]) - point_count[roots]
+    node_offset[roots] = np.cumsum(node_count[roots]) - node_count[roots]
+    # starts are the sum of the offsets up to the root, parents are placed
+    # before their children.
+    point_start = point_offset.tolist()
+    node_start = node_offset.tolist()
+    for i in range(Nnode - 1, -1, -1):
+        if parent[i] != -1:
+            point_start[i] += point_start[parent[i]]
+            node_start[i] += node_start[parent[i]]
+    point_start = np.array(point_start, dtype='int')
+    node_start = np.array(node_start, dtype='int')
+    point_order = np.zeros(Npoint, dtype='int')
+    point_order[point_start[:Npoint]] = np.arange(Npoint)
+    node_order = np.zeros(Nnode - Npoint, dtype='int')
+    node_order[node_start[Npoint:]] = np.arange(Nnode - Npoint)
+    return point_order, point_start, point_count, node_order, node_start, node_count
@@ -17,7 +17,9 @@ with open(path.join(this_directory, 'README.md')) as f:
     long_description = f.read()
 
 ext1 = Extension(name = 'mistreedev.utility_near_mst',
-                 sources = ['mistreedev/utility_near_mst.f90'])
+                 sources = ['mistreedev/utility_near_mst.f90'],
+                 extra_f90_compile_args = ['-fopenmp'],
+                 extra_link_args = ['-lgomp'])
 
 setup(name = 'mistreedev',
       version = '1.0.0',
@@ -30,8 +32,8 @@ setup(name = 'mistreedev',
       license='MIT',
       packages=setuptools.find_packages(),
       install_requires=['numpy', 'matplotlib', 'scipy', 'scikit-learn'],
-      ext_modules = [],
-      python_requires = '>=2.7',
+      ext_modules = [ext1],
+      python_requires = '>=3.9',
       classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Intended Audience :: Developers',
@@ -39,11 +41,11 @@ setup(name = 'mistreedev',
         'Natural Language :: English',
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Fortran',
-        'Programming Language :: Python :: 2.7',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
         'Topic :: Scientific/Engineering',
         'Topic :: Scientific/Engineering :: Astronomy',
         'Topic :: Scientific/Engineering :: Physics',
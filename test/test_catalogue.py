@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from mistreedev.catalogue import GroupCatalogue
+
+
+def get_catalogue():
+    rng = np.random.default_rng(0)
+    labels = rng.integers(-1, 20, 500)
+    groups = GroupCatalogue()
+    groups.set_labels(labels)
+    return groups
+
+
+def get_reference(groups):
+    reference = np.empty(len(groups), dtype='object')
+    reference[:] = [np.copy(group) for group in groups]
+    return reference
+
+
+@pytest.mark.parametrize('index', [slice(None, 10), slice(5, None, 3), slice(None, None, -1), np.array([3, 0, 3, 19]),
+                                   np.arange(20) % 3 == 0, np.array([], dtype='int'), [1, -1]])
+def test_get_subset(index):
+    groups = get_catalogue()
+    reference = get_reference(groups)[index]
+    subset = groups[index]
+    assert isinstance(subset, GroupCatalogue)
+    assert len(subset) == len(reference)
+    for group, group_reference in zip(subset, reference):
+        assert np.array_equal(group, group_reference)
+    assert np.array_equal(subset.ungrouped, groups.ungrouped)
+
+
+def test_getitem_int():
+    groups = get_catalogue()
+    reference = get_reference(groups)
+    assert np.array_equal(groups[np.int64(2)], reference[2])
+    assert np.array_equal(groups[-1], reference[-1])
+    with pytest.raises(IndexError):
+        groups[len(groups)]
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+import mistreedev as mistdev
+
+
+def get_random_tree(size, seed):
+    rng = np.random.default_rng(seed)
+    parent = (rng.random(size - 1)*np.arange(1, size)).astype('int')
+    edge_index = np.array([parent, np.arange(1, size)])
+    # rounded lengths so that some edges have the same length.
+    edge_length = np.round(rng.random(size - 1), 2)
+    return edge_index, edge_length
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_iter_groupID(seed):
+    size = 1000 + 500*seed
+    edge_index, edge_length = get_random_tree(size, seed)
+    fragment = mistdev.Fragment()
+    fragment.set_tree(size, edge_length, edge_index)
+    rng = np.random.default_rng(seed)
+    linking_lengths = np.sort(rng.uniform(edge_length.min() + 1e-3, edge_length.max() - 1e-3, 20))
+    groupID = np.full(size, -1)
+    edgeID = np.full(size - 1, -1)
+    for linking_length, (_groupID, _edgeID), (point_index, point_label, edge_index, edge_label) in \
+            zip(linking_lengths, fragment.iter_groupID(linking_lengths),
+                fragment.iter_groupID(linking_lengths, changed=True)):
+        groupID_ref, edgeID_ref = fragment.get_groupID(edge_length.min() - 1., linking_length)
+        assert np.array_equal(_groupID, groupID_ref)
+        assert np.array_equal(_edgeID, edgeID_ref)
+        # only labels which change are yielded.
+        assert np.all(groupID[point_index] != point_label)
+        assert np.all(edgeID[edge_index] != edge_label)
+        groupID[point_index] = point_label
+        edgeID[edge_index] = edge_label
+        assert np.array_equal(groupID, groupID_ref)
+        assert np.array_equal(edgeID, edgeID_ref)
+
+
+def get_groupID_reference(size, edge_index, edge_length, min_linking_length, max_linking_length):
+    # a plain union-find over the edges in the window, visited in order of length.
+    parent = list(range(size))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    order = [i for i in np.argsort(edge_length, kind='stable')
+             if min_linking_length <= edge_length[i] < max_linking_length]
+    grouped = set()
+    edge_creates = []
+    for i in order:
+        i1, i2 = int(edge_index[0][i]), int(edge_index[1][i])
+        # edges which only join two existing groups are not assigned to a group.
+        edge_creates.append(i1 not in grouped or i2 not in grouped)
+        grouped.update([i1, i2])
+        parent[find(i1)] = find(i2)
+    # groups are numbered by the first edge which created them.
+    root_label = {}
+    for i in order:
+        root = find(int(edge_index[0][i]))
+        if root not in root_label:
+            root_label[root] = len(root_label)
+    groupID = np.array([root_label[find(i)] if i in grouped else -1 for i in range(size)])
+    edgeID = np.full(len(edge_length), -1)
+    for i, creates in zip(order, edge_creates):
+        if creates:
+            edgeID[i] = root_label[find(int(edge_index[0][i]))]
+    return groupID, edgeID
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('min_linking_length', [None, 0.2, 0.35])
+def test_get_groupID(seed, min_linking_length):
+    size = 500 + 250*seed
+    edge_index, edge_length = get_random_tree(size, seed)
+    rng = np.random.default_rng(seed)
+    # shuffle the points so that the tree is not ordered by point index.
+    relabel = rng.permutation(size)
+    edge_index = relabel[edge_index]
+    fragment = mistdev.Fragment()
+    fragment.set_tree(size, edge_length, edge_index)
+    if min_linking_length is None:
+        # the window starts at the shortest edge and groups are cut from the merge tree.
+        min_linking_length = edge_length.min() - 1.
+    for max_linking_length in [0.4, 0.5, 0.75]:
+        groupID, edgeID = fragment.get_groupID(min_linking_length, max_linking_length)
+        groupID_ref, edgeID_ref = get_groupID_reference(size, edge_index, edge_length,
+                                                        min_linking_length, max_linking_length)
+        assert np.array_equal(groupID, groupID_ref)
+        assert np.array_equal(edgeID, edgeID_ref)
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import mistreedev as mistdev
+
+
+def get_sorted_friends(indptr, indices):
+    return [np.sort(indices[indptr[i]:indptr[i+1]]) for i in range(0, len(indptr) - 1)]
+
+
+def get_points(ndim, boxsize=None, seed=0):
+    rng = np.random.default_rng(seed)
+    # uniform points with a dense clump, so the grid is made coarser than the
+    # linking length.
+    pos = np.concatenate([rng.random((600, ndim)), 0.5 + 1e-3*rng.standard_normal((200, ndim))])
+    pos[-1] = pos[0]
+    if boxsize is not None:
+        pos = np.clip(pos, 0., 1. - 1e-12)*(np.array(boxsize)[:ndim] if np.ndim(boxsize) > 0 else boxsize)
+    return pos
+
+
+@pytest.mark.parametrize('ndim', [2, 3])
+@pytest.mark.parametrize('boxsize', [None, 1., [1., 0.8, 1.2]])
+@pytest.mark.parametrize('linking_length', [0.03, 0.3, 0.45])
+def test_find_friends_grid(ndim, boxsize, linking_length):
+    pos = get_points(ndim, boxsize=boxsize)
+    if boxsize is not None and np.ndim(boxsize) > 0:
+        boxsize = np.array(boxsize)[:ndim]
+    indptr, indices = mistdev.find_friends_nd(pos, linking_length, boxsize=boxsize)
+    friends = get_sorted_friends(indptr, indices)
+    for n_jobs, chunk_size in [(1, 100000), (3, 100)]:
+        _indptr, _indices = mistdev.find_friends_nd(pos, linking_length, boxsize=boxsize, n_jobs=n_jobs,
+                                                    chunk_size=chunk_size, engine='grid')
+        assert np.array_equal(_indptr, indptr)
+        for _friend, friend in zip(get_sorted_friends(_indptr, _indices), friends):
+            assert np.array_equal(_friend, friend)
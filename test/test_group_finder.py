@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+import mistreedev as mistdev
+
+
+def get_points(size=20000):
+    rng = np.random.default_rng(0)
+    return rng.random((3, size))
+
+
+@pytest.mark.parametrize('reuse_tree', [False, True])
+def test_get_catalogue_in_place_edit(reuse_tree):
+    x, y, z = get_points()
+    gf = mistdev.GroupFinder(reuse_tree=reuse_tree)
+    gf.get_catalogue(0.02, x, y, z)
+    rng = np.random.default_rng(1)
+    x[1:500:2] = rng.random(250)
+    x_cat, y_cat, z_cat = gf.get_catalogue(0.02, x, y, z)
+    x_ref, y_ref, z_ref = mistdev.GroupFinder().get_catalogue(0.02, x, y, z)
+    assert len(x_cat) == len(x_ref)
+    assert np.allclose(x_cat, x_ref) and np.allclose(y_cat, y_ref) and np.allclose(z_cat, z_ref)
+
+
+def test_get_catalogue_in_place_edit_cache():
+    x, y, z = get_points()
+    mistdev.set_kdtree_cache(2)
+    try:
+        mistdev.GroupFinder().get_catalogue(0.02, x, y, z)
+        x[1:500:2] = np.random.default_rng(1).random(250)
+        x_cat, _, _ = mistdev.GroupFinder().get_catalogue(0.02, x, y, z)
+    finally:
+        mistdev.set_kdtree_cache(0)
+    mistdev.clear_kdtree_cache()
+    x_ref, _, _ = mistdev.GroupFinder().get_catalogue(0.02, x, y, z)
+    assert np.allclose(x_cat, x_ref)
+
+
+def test_reuse_tree():
+    x, y, z = get_points()
+    gf = mistdev.GroupFinder(reuse_tree=True)
+    gf.get_catalogue(0.02, x, y, z)
+    tree_data = gf.tree_data
+    gf.get_catalogue(0.03, x, y, z)
+    assert gf.tree_data is tree_data
+    gf = mistdev.GroupFinder()
+    gf.get_catalogue(0.02, x, y, z)
+    tree_data = gf.tree_data
+    gf.get_catalogue(0.02, x, y, z)
+    assert gf.tree_data is not tree_data
+
+
+@pytest.mark.parametrize('ndim', [2, 3])
+def test_add_points(ndim):
+    pos = get_points(3000)[:ndim]
+    gf = mistdev.GroupFinder()
+    pos_cat = gf.get_catalogue(0.05, *pos)
+    labels = np.copy(gf.labels)
+    # batches of different sizes, including empty batches.
+    edges = [0, 0, 700, 700, 1000, 1001, 2500, 3000]
+    gf_add = mistdev.GroupFinder()
+    for start, end in zip(edges[:-1], edges[1:]):
+        batch = [_x[start:end] for _x in pos]
+        if ndim == 2:
+            gf_add.add_points(batch[0], batch[1], linking_length=0.05)
+        else:
+            gf_add.add_points(batch[0], batch[1], batch[2], linking_length=0.05)
+    pos_add = gf_add.get_incremental_catalogue()
+    assert np.array_equal(gf_add.labels, labels)
+    for _x_cat, _x_add in zip(pos_cat, pos_add):
+        assert np.allclose(_x_cat, _x_add)
+    # adding an empty batch to an existing catalogue leaves it unchanged.
+    gf.add_points(*[np.zeros(0)]*ndim)
+    gf.get_incremental_catalogue()
+    assert np.array_equal(gf.labels, labels)
+
+
+def test_get_catalogue_stats():
+    x, y, z = get_points(2000)
+    stats = mistdev.StageStats(track_memory=False)
+    gf = mistdev.GroupFinder()
+    gf.get_catalogue(0.05, x, y, z, stats=stats)
+    record = stats.to_json()
+    assert 'kdtree_build' in stats.stages and stats.counts['groups'] == len(gf.groups)
+    # stats are not recorded after the call.
+    gf.find_friends(0.06)
+    gf.count_friends()
+    gf.get_groups()
+    assert gf.stats is None
+    assert stats.to_json() == record
+
+
+@pytest.mark.parametrize('n_workers', [1, 2, 3, 5])
+@pytest.mark.parametrize('ndim', [2, 3])
+def test_find_groups_parallel(n_workers, ndim):
+    rng = np.random.default_rng(n_workers)
+    # the extent across the slabs is chosen so that points are close to
+    # percolating for linking lengths near the slab width.
+    size = 2000
+    slab_width = 1./n_workers
+    if ndim == 2:
+        extent = size*np.pi*slab_width**2/1.5
+    else:
+        extent = np.sqrt(size*4.*np.pi*slab_width**3/4.5)
+    x = rng.random(size)
+    y, z = extent*rng.random((2, size))
+    z = z if ndim == 3 else None
+    slab_width = np.diff(np.quantile(x, np.linspace(0., 1., n_workers + 1))).min()
+    for linking_length in [0.5*slab_width, 0.9*slab_width, slab_width, 1.1*slab_width]:
+        labels = mistdev.find_groups_parallel(linking_length, x, y, z, n_workers=n_workers)
+        gf = mistdev.GroupFinder()
+        gf.get_catalogue(linking_length, x, y, z)
+        assert gf.N_groups > 1
+        assert np.array_equal(labels, gf.labels)
+
+
+def get_friends_reference(pos, linking_length, boxsize=None):
+    # distances between every pair of points.
+    dpos = np.abs(pos[:, np.newaxis, :] - pos[np.newaxis, :, :])
+    if boxsize is not None:
+        dpos = np.minimum(dpos, boxsize - dpos)
+    dist = np.sqrt(np.sum(dpos**2, axis=-1))
+    # points are not friends of themselves.
+    np.fill_diagonal(dist, np.inf)
+    return [np.where(dist[i] <= linking_length)[0] for i in range(0, len(pos))]
+
+
+@pytest.mark.parametrize('ndim', [2, 3])
+@pytest.mark.parametrize('boxsize', [None, 1., [1., 0.8, 1.2]])
+def test_find_friends_nd_n_jobs(ndim, boxsize):
+    rng = np.random.default_rng(ndim)
+    pos = rng.random((1500, ndim))
+    if boxsize is not None:
+        boxsize = np.array(boxsize)[:ndim] if np.ndim(boxsize) > 0 else boxsize
+        pos *= boxsize
+    linking_length = 0.04 if ndim == 2 else 0.08
+    indptr, indices = mistdev.find_friends_nd(pos, linking_length, boxsize=boxsize)
+    friends_ref = get_friends_reference(pos, linking_length, boxsize=boxsize)
+    for i in range(0, len(pos)):
+        assert np.array_equal(np.sort(indices[indptr[i]:indptr[i+1]]), friends_ref[i])
+    for n_jobs, chunk_size in [(2, 100000), (3, 64), (4, 1)]:
+        _indptr, _indices = mistdev.find_friends_nd(pos, linking_length, boxsize=boxsize, n_jobs=n_jobs,
+                                                    chunk_size=chunk_size)
+        assert np.array_equal(_indptr, indptr)
+        assert np.array_equal(_indices, indices)
@@ -0,0 +1,42 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import mistreedev
+
+# import budget of a bare 'import mistreedev', measured in a fresh interpreter.
+max_import_time = 1.
+max_modules = 100
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def get_import_info():
+    code = ('import sys; import mistreedev; Nmodules = len(sys.modules); modules = sorted(sys.modules); '
+            'import json; print(json.dumps([Nmodules, modules]))')
+    env = dict(os.environ, PYTHONPATH=root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    t0 = time.perf_counter()
+    output = subprocess.check_output([sys.executable, '-c', code], env=env)
+    wall_time = time.perf_counter() - t0
+    Nmodules, modules = json.loads(output)
+    return wall_time, Nmodules, modules
+
+
+def test_import_is_lazy():
+    _, _, modules = get_import_info()
+    for name in ['sklearn', 'scipy', 'mistree']:
+        assert name not in modules, '%s is imported by import mistreedev.' % name
+
+
+def test_import_budget():
+    wall_time, Nmodules, _ = get_import_info()
+    assert Nmodules < max_modules
+    assert wall_time < max_import_time
+
+
+def test_all_names_resolve():
+    for name in mistreedev.__all__:
+        assert getattr(mistreedev, name) is not None
+        assert name in dir(mistreedev)
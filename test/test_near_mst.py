@@ -0,0 +1,18 @@
+import numpy as np
+
+import mistreedev as mistdev
+
+
+def test_count_in_cylinders():
+    rng = np.random.default_rng(0)
+    x, y, z = rng.random((3, 3000))
+    # short and long edges compared to the cylinder radius.
+    edge_index = rng.integers(0, 3000, (2, 300))
+    edge_index = edge_index[:, edge_index[0] != edge_index[1]]
+    rmax = np.array([0.005, 0.02, 0.1])
+    counts = mistdev.count_in_cylinders(x, y, z, edge_index, rmax, chunk_size=70)
+    for i in range(0, len(edge_index[0])):
+        i0, i1 = edge_index[:, i]
+        dist_para, dist_perp = mistdev.dist_from_line(x[i0], y[i0], z[i0], x[i1], y[i1], z[i1], x, y, z,
+                                                      use_backend='numpy')
+        assert np.array_equal(counts[i], mistdev.count_in_cylinder(dist_para, dist_perp, rmax))
@@ -0,0 +1,49 @@
+import numpy as np
+
+import mistreedev as mistdev
+from mistreedev.group_finder import wrap_positions
+
+
+def get_boundary_points(dtype='float64'):
+    rng = np.random.default_rng(0)
+    x, y, z = rng.random((3, 2000)).astype(dtype)
+    # points on the box edges and drifting just outside them.
+    x[:4] = [-1e-17, 0., 1., -1e-9]
+    y[:4] = [1., -1e-17, 0.5, 1. + 1e-12]
+    z[:4] = [0.5, 0.5, -1e-17, 0.]
+    return x, y, z
+
+
+def test_wrap_positions():
+    x, y, z = get_boundary_points()
+    pos = wrap_positions(np.array([x, y, z]).T, 1.)
+    assert np.all(pos >= 0.) and np.all(pos < 1.)
+    x, y, z = get_boundary_points(dtype='float32')
+    pos = wrap_positions(np.array([x, y, z]).T, np.array([1., 1., 1.]))
+    assert np.all(pos >= 0.) and np.all(pos < 1.)
+
+
+def test_get_catalogue_boundary():
+    x, y, z = get_boundary_points()
+    gf = mistdev.GroupFinder()
+    gf.get_catalogue(0.05, x, y, z, boxsize=1.)
+    gf_grid = mistdev.GroupFinder(engine='grid')
+    gf_grid.get_catalogue(0.05, x, y, z, boxsize=1.)
+    assert np.array_equal(gf.labels, gf_grid.labels)
+    # the corner points are friends across the periodic boundaries.
+    assert gf.labels[0] != -1 and gf.labels[0] == gf.labels[1]
+
+
+def test_get_catalogue_boundary_float32():
+    x, y, z = get_boundary_points(dtype='float32')
+    gf = mistdev.GroupFinder()
+    gf.get_catalogue(0.05, x, y, z, boxsize=1.)
+    assert len(gf.labels) == len(x)
+
+
+def test_get_labels_sweep_boundary():
+    x, y, z = get_boundary_points()
+    labels = mistdev.GroupFinder().get_labels_sweep([0.02, 0.05], x, y, z, boxsize=1.)
+    gf = mistdev.GroupFinder()
+    gf.get_catalogue(0.05, x, y, z, boxsize=1.)
+    assert np.array_equal(labels[1], gf.labels)
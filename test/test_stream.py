@@ -0,0 +1,33 @@
+import numpy as np
+
+import mistreedev as mistdev
+
+
+def get_points():
+    rng = np.random.default_rng(1)
+    return rng.random((3, 5000))
+
+
+def test_get_catalogue_output(tmp_path):
+    x, y, z = get_points()
+    gf = mistdev.GroupFinder()
+    x_ref, y_ref, z_ref = gf.get_catalogue(0.03, x, y, z)
+    labels_ref = np.copy(gf.labels)
+    gf_out = mistdev.GroupFinder()
+    x_cat, y_cat, z_cat = gf_out.get_catalogue(0.03, x, y, z, output=str(tmp_path), ntiles=3)
+    assert np.array_equal(np.asarray(gf_out.labels), labels_ref)
+    assert np.allclose(x_cat, x_ref) and np.allclose(y_cat, y_ref) and np.allclose(z_cat, z_ref)
+    catalogue = mistdev.load_catalogue(str(tmp_path))
+    assert catalogue['N_groups'] == len(gf.groups)
+    for group, group_ref in zip(catalogue['groups'], gf.groups):
+        assert np.array_equal(group, group_ref)
+
+
+def test_get_catalogue_output_periodic(tmp_path):
+    x, y, z = get_points()
+    gf = mistdev.GroupFinder()
+    x_ref, y_ref, z_ref = gf.get_catalogue(0.03, x, y, z, boxsize=1.)
+    gf_out = mistdev.GroupFinder()
+    x_cat, y_cat, z_cat = gf_out.get_catalogue(0.03, x, y, z, boxsize=1., output=str(tmp_path))
+    assert np.array_equal(np.asarray(gf_out.labels), gf.labels)
+    assert np.allclose(x_cat, x_ref) and np.allclose(y_cat, y_ref) and np.allclose(z_cat, z_ref)
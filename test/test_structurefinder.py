@@ -0,0 +1,61 @@
+import numpy as np
+
+import mistreedev as mistdev
+
+
+def get_group_edges_reference(groups, friends_in_groups):
+    # the per-member loop of earlier versions.
+    edge_end1 = [[groups[j][i] for i in range(0, len(groups[j])) if len(friends_in_groups[j][i]) > 0]
+                 for j in range(0, len(groups))]
+    edge_end2 = [[friends_in_groups[j][i].tolist() for i in range(0, len(groups[j])) if len(friends_in_groups[j][i]) > 0]
+                 for j in range(0, len(groups))]
+    return edge_end1, edge_end2
+
+
+def get_random_tree(size, seed=0):
+    rng = np.random.default_rng(seed)
+    parent = (rng.random(size - 1)*np.arange(1, size)).astype('int')
+    edge_index = np.array([parent, np.arange(1, size)])
+    edge_length = rng.random(size - 1)
+    return edge_index, edge_length
+
+
+def test_get_group_edges():
+    size = 2000
+    edge_index, edge_length = get_random_tree(size)
+    condition = np.where(edge_length < 0.5)[0]
+    friends = mistdev.find_friends(size, edge_index[:, condition])
+    groups = mistdev.friends2groups(friends)
+    friends_in_groups = mistdev.get_friends_in_groups(friends, groups)
+    edge_end1, edge_end2 = mistdev.get_group_edges(groups, friends_in_groups)
+    edge_end1_ref, edge_end2_ref = get_group_edges_reference(groups, friends_in_groups)
+    assert len(edge_end1) == len(edge_end1_ref) == len(groups)
+    for j in range(0, len(groups)):
+        assert [int(i) for i in edge_end1_ref[j]] == edge_end1[j]
+        assert edge_end2_ref[j] == edge_end2[j]
+
+
+def get_overlapping_groups(size, seed=0):
+    rng = np.random.default_rng(seed)
+    groups = [rng.choice(size, rng.integers(1, 20), replace=False) for i in range(0, 50)]
+    # the same points are members of several groups.
+    groups.append(np.copy(groups[0]))
+    groups.append(np.concatenate([groups[1], groups[2]]))
+    return groups
+
+
+def test_get_group_mean_overlap():
+    size = 200
+    rng = np.random.default_rng(1)
+    param, weights = rng.random((2, size))
+    groups = get_overlapping_groups(size)
+    group_mean = mistdev.get_group_mean(groups, param)
+    assert np.allclose(group_mean, [np.mean(param[group]) for group in groups])
+    group_mean = mistdev.get_group_mean(groups, param, weights=weights)
+    assert np.allclose(group_mean, [np.average(param[group], weights=weights[group]) for group in groups])
+    group_mean = mistdev.get_group_param_mean(groups, param)
+    assert np.allclose(group_mean, [np.mean(param[group]) for group in groups])
+    group_sum = mistdev.get_group_param_sum(groups, param)
+    assert np.allclose(group_sum, [np.sum(param[group]) for group in groups])
+    group_mean = mistdev.get_group_param_mean_periodic(groups, 0.1*param, 1.)
+    assert np.allclose(group_mean, [np.mean(0.1*param[group]) for group in groups])
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+import mistreedev as mistdev
+
+
+def get_degree(edge_index, Npoint):
+    return np.bincount(np.asarray(edge_index).flatten(), minlength=Npoint).astype('float')
+
+
+def get_mst(size, seed):
+    mst = pytest.importorskip('mistree.mst')
+    rng = np.random.default_rng(seed)
+    x, y = rng.random((2, size))
+    edge_length, edge_x, edge_y, edge_index = mst.construct_mst(x, y, two_dimensions=True)
+    return edge_index, edge_length
+
+
+def trim_tree_reference(degree, edge_index, edge_length):
+    # tip removal with remove_tree_tips as in earlier versions of trim_tree,
+    # also keeping track of the step in which each edge is removed.
+    _degree = np.copy(degree)
+    _edge_index = np.copy(edge_index)
+    _edge = np.arange(len(edge_length))
+    trim_label = np.zeros(len(edge_length), dtype='int')
+    edge_length_trim = [0.]
+    num_edges_removed = [0.]
+    while np.sum(_degree) > 2. and len(_edge_index[0]) > 2.:
+        _degree, _edge_index, edge_bool = mistdev.remove_tree_tips(_degree, _edge_index)
+        trim_label[_edge[edge_bool]] = len(edge_length_trim)
+        edge_length_trim.append(np.sum(edge_length[_edge[edge_bool]]))
+        num_edges_removed.append(float(np.count_nonzero(edge_bool)))
+        _edge = _edge[np.invert(edge_bool)]
+    trim_label[_edge] = len(edge_length_trim)
+    edge_length_trim.append(np.sum(edge_length[_edge]))
+    num_edges_removed.append(1. if np.sum(_degree) == 2. else 2.)
+    return np.array(edge_length_trim), np.cumsum(edge_length_trim), np.array(num_edges_removed), trim_label
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_trim_tree(seed):
+    edge_index, edge_length = get_mst(40 + 20*seed, seed)
+    degree = get_degree(edge_index, 40 + 20*seed)
+    trim_steps, edge_length_trim, edge_length_cumulative, num_edges_removed, trim_label = \
+        mistdev.trim_tree(degree, edge_index, edge_length, return_trim_label=True)
+    edge_length_trim_ref, edge_length_cumulative_ref, num_edges_removed_ref, trim_label_ref = \
+        trim_tree_reference(degree, edge_index, edge_length)
+    assert np.array_equal(trim_steps, np.arange(len(edge_length_trim_ref)))
+    assert np.allclose(edge_length_trim, edge_length_trim_ref)
+    assert np.allclose(edge_length_cumulative, edge_length_cumulative_ref)
+    assert np.array_equal(num_edges_removed, num_edges_removed_ref)
+    assert np.array_equal(trim_label, trim_label_ref)
+    # the trimming curve without the trim labels is unchanged.
+    for value, value_ref in zip(mistdev.trim_tree(degree, edge_index, edge_length),
+                                [trim_steps, edge_length_trim, edge_length_cumulative, num_edges_removed]):
+        assert np.array_equal(value, value_ref)
+
+
+@pytest.mark.parametrize('edge_index', [[[0], [1]], [[0, 1], [1, 2]], [[0, 0, 0, 0], [1, 2, 3, 4]],
+                                        [[0, 1, 2, 3, 4], [1, 2, 3, 4, 5]]])
+def test_trim_tree_small(edge_index):
+    pytest.importorskip('mistree')
+    edge_index = np.array(edge_index)
+    edge_length = 1. + np.arange(len(edge_index[0]))
+    degree = get_degree(edge_index, edge_index.max() + 1)
+    trim_steps, edge_length_trim, edge_length_cumulative, num_edges_removed, trim_label = \
+        mistdev.trim_tree(degree, edge_index, edge_length, return_trim_label=True)
+    edge_length_trim_ref, edge_length_cumulative_ref, num_edges_removed_ref, trim_label_ref = \
+        trim_tree_reference(degree, edge_index, edge_length)
+    assert np.allclose(edge_length_trim, edge_length_trim_ref)
+    assert np.allclose(edge_length_cumulative, edge_length_cumulative_ref)
+    assert np.array_equal(num_edges_removed, num_edges_removed_ref)
+    assert np.array_equal(trim_label, trim_label_ref)
+
+
+def get_random_tree(size, seed):
+    rng = np.random.default_rng(seed)
+    parent = (rng.random(size - 1)*np.arange(1, size)).astype('int')
+    edge_index = np.array([parent, np.arange(1, size)])
+    edge_length = rng.random(size - 1)
+    return edge_index, edge_length
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_trim_forest(seed):
+    rng = np.random.default_rng(seed)
+    sizes = [2, 3, 4, 50, 200, 7, 1000]
+    edge_index, edge_length, edge_component = [], [], []
+    Npoint = 0
+    for i, size in enumerate(sizes):
+        _edge_index, _edge_length = get_random_tree(size, seed + i)
+        edge_index.append(_edge_index + Npoint)
+        edge_length.append(_edge_length)
+        # component labels need not be contiguous.
+        edge_component.append(np.full(size - 1, 10*i + 3))
+        Npoint += size
+    # the edges of the trees are interleaved.
+    order = rng.permutation(Npoint - len(sizes))
+    edge_index = np.concatenate(edge_index, axis=1)[:, order]
+    edge_length = np.concatenate(edge_length)[order]
+    edge_component = np.concatenate(edge_component)[order]
+    degree = get_degree(edge_index, Npoint)
+    trim_steps, edge_length_trim, edge_length_cumulative, num_edges_removed, offsets, components, trim_label = \
+        mistdev.trim_forest(degree, edge_index, edge_length, edge_component, return_trim_label=True)
+    assert np.array_equal(components, 10*np.arange(len(sizes)) + 3)
+    for i, component in enumerate(components):
+        condition = np.where(edge_component == component)[0]
+        tree_ref = mistdev.trim_tree(degree, edge_index[:, condition], edge_length[condition], return_trim_label=True)
+        tree = [trim_steps, edge_length_trim, edge_length_cumulative, num_edges_removed]
+        for value, value_ref in zip(tree, tree_ref[:-1]):
+            assert np.allclose(value[offsets[i]:offsets[i+1]], value_ref)
+        assert np.array_equal(trim_label[condition], tree_ref[-1])